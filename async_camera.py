@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Asyncio Camera Transport
+Non-blocking ESP32-CAM client for asyncio programs. The serial fd is watched
+with loop.add_reader, and every chunk goes through FrameParser: binary frames
+resolve pending capture() calls, and the text between frames is split into
+status lines that resolve pending command() calls. Captures, status polls,
+PLC pulses and logging can then share one event loop:
+
+    async with AsyncCamera(port) as camera:
+        jpeg = await camera.capture(timeout=3)
+        status = await camera.command('S')   # -> "STATUS:OK"
+
+Timeouts return None, like CameraCapture.capture(); cancelling a call just
+withdraws it. The frame an abandoned capture asked for may still arrive; it
+is discarded, so it never answers the next capture(). Run directly for a
+demo against the simulated camera.
+"""
+
+import asyncio
+import collections
+import os
+import time
+
+import serial
+
+from frame_parser import MAX_FRAME_LEN, FrameParser
+
+BAUD_RATE = 921600
+CAPTURE_TIMEOUT = 3.0
+COMMAND_TIMEOUT = 1.0  # replies queue behind a frame in flight, so allow a full transfer
+READ_SIZE = 65536
+
+# Status line prefix each firmware command answers with
+REPLY_PREFIX = {
+    'S': 'STATUS', 'R': 'RESOLUTION', 'V': 'RESOLUTION', 'L': 'LED', 'O': 'LED',
+    'F': 'EXPOSURE', 'M': 'EXPOSURE', 'A': 'EXPOSURE', 'P': 'ARMED', 'D': 'DISARMED',
+}
+
+class AsyncCamera:
+    """ESP32-CAM over serial with async capture() and command() calls"""
+
+    def __init__(self, port, baud=BAUD_RATE, max_frame_len=MAX_FRAME_LEN):
+        self.port = port
+        self.baud = baud
+        self.parser = FrameParser(max_frame_len, on_skip=self._on_text)
+        self.lines = collections.deque(maxlen=100)  # unsolicited status/boot lines
+        self.stats = {'frames': 0, 'orphan_frames': 0, 'lines': 0, 'timeouts': 0, 'cancelled': 0}
+        # One deadline per abandoned capture whose frame may still be on the wire;
+        # a frame that never comes stops being waited for at its deadline
+        self._abandoned = collections.deque()
+        self.ser = None
+        self._loop = None
+        self._text = bytearray()
+        self._frame_waiters = collections.deque()
+        self._line_waiters = collections.deque()  # (prefix, future)
+        self._capture_lock = None
+
+    async def open(self):
+        self._loop = asyncio.get_running_loop()
+        self._capture_lock = asyncio.Lock()
+        self.ser = serial.Serial(self.port, self.baud, timeout=0)
+        self._loop.add_reader(self.ser.fileno(), self._on_readable)
+        return self
+
+    def close(self):
+        if self.ser is None:
+            return
+        self._loop.remove_reader(self.ser.fileno())
+        self.ser.close()
+        self.ser = None
+        self._fail_waiters(ConnectionError("camera closed"))
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def capture(self, timeout=CAPTURE_TIMEOUT):
+        """Trigger one capture and wait for its frame; None on timeout"""
+        async with self._capture_lock:
+            # Like CameraCapture.capture(): drop any partial frame from an abandoned capture
+            self.parser.reset()
+            future = self._loop.create_future()
+            self._frame_waiters.append(future)
+            self.ser.write(b'C')
+            sent = time.monotonic()
+            try:
+                return await self._wait(future, self._frame_waiters, timeout)
+            finally:
+                if not future.done() or future.cancelled():
+                    self._abandoned.append(sent + max(timeout, CAPTURE_TIMEOUT))
+
+    async def command(self, cmd, timeout=COMMAND_TIMEOUT):
+        """Send a single-letter command and wait for its status line; None on timeout"""
+        cmd = cmd.upper()
+        future = self._loop.create_future()
+        entry = (REPLY_PREFIX[cmd], future)
+        self._line_waiters.append(entry)
+        self.ser.write(cmd.encode('ascii'))
+        return await self._wait(future, self._line_waiters, timeout, entry)
+
+    async def _wait(self, future, waiters, timeout, entry=None):
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            return None
+        except asyncio.CancelledError:
+            self.stats['cancelled'] += 1
+            raise
+        finally:
+            entry = future if entry is None else entry
+            if entry in waiters:
+                waiters.remove(entry)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.ser.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data, error = b'', e
+        else:
+            error = None
+        if not data:
+            self._loop.remove_reader(self.ser.fileno())
+            self._fail_waiters(ConnectionError(f"serial port closed: {error or 'EOF'}"))
+            return
+        for frame in self.parser.feed(data):
+            self.stats['frames'] += 1
+            self._resolve_frame(frame)
+
+    def _resolve_frame(self, frame):
+        now = time.monotonic()
+        while self._abandoned and self._abandoned[0] < now:
+            self._abandoned.popleft()
+        if self._abandoned:
+            # Frames come back in command order: this one belongs to an abandoned capture
+            self._abandoned.popleft()
+            self.stats['orphan_frames'] += 1
+            return
+        while self._frame_waiters:
+            future = self._frame_waiters.popleft()
+            if not future.done():
+                future.set_result(frame)
+                return
+        self.stats['orphan_frames'] += 1  # unsolicited, e.g. sent after a reset
+
+    def _on_text(self, data):
+        """Parser callback for bytes between frames: split into status lines"""
+        self._text += data
+        while True:
+            end = self._text.find(b'\n')
+            if end == -1:
+                break
+            line = self._text[:end].decode('ascii', errors='ignore').strip()
+            del self._text[:end + 1]
+            if line:
+                self.stats['lines'] += 1
+                self._resolve_line(line)
+
+    def _resolve_line(self, line):
+        for entry in self._line_waiters:
+            prefix, future = entry
+            if line.startswith(prefix) and not future.done():
+                self._line_waiters.remove(entry)
+                future.set_result(line)
+                return
+        self.lines.append(line)
+
+    def _fail_waiters(self, error):
+        for future in list(self._frame_waiters) + [f for _, f in self._line_waiters]:
+            if not future.done():
+                future.set_exception(error)
+        self._frame_waiters.clear()
+        self._line_waiters.clear()
+
+async def demo(port, baud, count):
+    async with AsyncCamera(port, baud) as camera:
+        print(f"Status: {await camera.command('S')}")
+
+        # Timeout and cancellation leave the transport usable
+        print(f"Capture with 5ms timeout -> {await camera.capture(timeout=0.005)}")
+        task = asyncio.create_task(camera.capture())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            print("Capture cancelled")
+
+        polls = []
+        pulses = 0
+
+        async def poll_status():
+            while True:
+                t0 = time.monotonic()
+                polls.append((await camera.command('S'), time.monotonic() - t0))
+                await asyncio.sleep(0.1)
+
+        async def plc_pulses():
+            # Stands in for set_plc(): the 100ms pulse no longer blocks the link
+            nonlocal pulses
+            while True:
+                await asyncio.sleep(0.1)
+                pulses += 1
+
+        background = [asyncio.create_task(poll_status()), asyncio.create_task(plc_pulses())]
+        start = time.monotonic()
+        sizes = []
+        for _ in range(count):
+            jpeg = await camera.capture()
+            sizes.append(len(jpeg) if jpeg is not None else 0)
+        elapsed = time.monotonic() - start
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+
+        ok = sum(1 for s in sizes if s)
+        replies = [p for p, _ in polls if p]
+        print(f"Captured {ok}/{count} frames in {elapsed:.2f}s ({ok / elapsed:.1f} fps) "
+              f"while serving {len(replies)}/{len(polls)} status polls and {pulses} PLC pulses")
+        if polls:
+            print(f"Status reply latency max {max(t for _, t in polls) * 1000:.0f}ms "
+                  f"(replies wait behind a frame in flight)")
+        print(f"Transport stats: {camera.stats}")
+
+def main():
+    from sim_camera import SimulatedCamera, load_frames
+
+    with SimulatedCamera(load_frames()) as sim:
+        print(f"📷 Simulated camera on {sim.port}")
+        asyncio.run(demo(sim.port, sim.baud, 20))
+
+if __name__ == "__main__":
+    main()
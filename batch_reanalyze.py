@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Batch Re-analysis
+Re-scores captured frames (tyre_*.jpg, manual_*.jpg, ...) across all cores,
+e.g. after a threshold or mask change, and streams one row per image to CSV
+or Parquet:
+
+    python3 batch_reanalyze.py capture_test/ -o results.csv
+    python3 batch_reanalyze.py shift.tar.gz -o results.parquet --solidity-threshold 0.9
+
+Sources can be a directory (searched recursively), a frame archive
+(frame_archive.py), a tar archive (any compression) or a zip. Work is sent
+to a process pool in chunks with a bounded number in flight, so a shift's
+worth of images is never held in memory.
+"""
+
+import argparse
+import concurrent.futures as cf
+import csv
+import fnmatch
+import os
+import tarfile
+import time
+import zipfile
+
+from frame_archive import FrameArchive, is_archive, read_frame_at
+
+FIELDS = ['file', 'image_size', 'dot_found', 'dot_size', 'area',
+          'circularity', 'solidity', 'verdict', 'error']
+PATTERNS = ('*.jpg', '*.jpeg')
+
+_settings = None  # per-worker analysis settings, set by init_worker
+
+def is_image(name):
+    name = os.path.basename(name).lower()
+    return any(fnmatch.fnmatch(name, p) for p in PATTERNS)
+
+def iter_directory(path):
+    """Yield (name, file path) for every image under a directory; workers read the files"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if is_image(name):
+                full = os.path.join(root, name)
+                yield os.path.relpath(full, path), full
+
+def iter_tar(path):
+    """Yield (name, JPEG bytes) streaming through a tar archive"""
+    with tarfile.open(path, 'r|*') as tar:
+        for member in tar:
+            if member.isfile() and is_image(member.name):
+                yield member.name, tar.extractfile(member).read()
+
+def iter_zip(path):
+    """Yield (name, JPEG bytes) from a zip archive"""
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if not info.is_dir() and is_image(info.filename):
+                yield info.filename, zf.read(info)
+
+def iter_archive(path):
+    """Yield (key, (segment path, offset, length)) per archived frame; workers map the segments"""
+    archive = FrameArchive(path, readonly=True)
+    try:
+        for key, seg_path, offset, length in archive.locations():
+            yield key, (seg_path, offset, length)
+    finally:
+        archive.close()
+
+def iter_source(path):
+    if is_archive(path):
+        return iter_archive(path)
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if zipfile.is_zipfile(path):
+        return iter_zip(path)
+    if tarfile.is_tarfile(path):
+        return iter_tar(path)
+    raise SystemExit(f"Not a directory, tar or zip archive: {path}")
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def init_worker(solidity_threshold, roi, use_lut):
+    """Per-process setup: one OpenCV thread per worker, shared settings"""
+    global _settings
+    import cv2
+    import sync_capture_test as sct
+    from colour_lut import ColourMaskLUT
+
+    cv2.setNumThreads(1)
+    if solidity_threshold is not None:
+        sct.SOLIDITY_THRESHOLD = solidity_threshold
+    _settings = {'roi': roi, 'lut': ColourMaskLUT(sct.PAINT_HSV_RANGES) if use_lut else None}
+
+def analyze_chunk(items):
+    """Worker: analyze a list of (name, path, bytes or archive location) and return result rows"""
+    from sync_capture_test import analyze_frame
+
+    rows = []
+    for name, payload in items:
+        try:
+            if isinstance(payload, str):
+                with open(payload, 'rb') as f:
+                    payload = f.read()
+            elif isinstance(payload, tuple):
+                payload = read_frame_at(*payload)  # view into the worker's segment map
+            result = analyze_frame(payload, None, _settings['roi'], _settings['lut'])
+        except Exception as e:
+            result = {'error': str(e)}
+        result['file'] = name
+        rows.append({k: result.get(k) for k in FIELDS})
+    return rows
+
+class CsvSink:
+    def __init__(self, path):
+        self.f = open(path, 'w', newline='')
+        self.writer = csv.DictWriter(self.f, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+class ParquetSink:
+    """Buffers rows into row groups; needs pyarrow (pip3 install pyarrow)"""
+
+    ROW_GROUP = 10000
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip3 install pyarrow")
+        self.pa = pa
+        self.schema = pa.schema([
+            ('file', pa.string()), ('image_size', pa.string()), ('dot_found', pa.bool_()),
+            ('dot_size', pa.string()), ('area', pa.int64()), ('circularity', pa.float64()),
+            ('solidity', pa.float64()), ('verdict', pa.string()), ('error', pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.pending = []
+
+    def write(self, rows):
+        self.pending += rows
+        if len(self.pending) >= self.ROW_GROUP:
+            self._flush()
+
+    def _flush(self):
+        if self.pending:
+            self.writer.write_table(self.pa.Table.from_pylist(self.pending, schema=self.schema))
+            self.pending = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+def parse_roi(value):
+    if value is None or value == 'auto':
+        return value
+    return tuple(int(v) for v in value.split(','))
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-run paint dot analysis over captured images")
+    ap.add_argument('source', help="directory, frame archive, tar or zip of JPEGs")
+    ap.add_argument('-o', '--output', default='reanalysis.csv', help=".csv or .parquet")
+    ap.add_argument('--workers', type=int, default=os.cpu_count())
+    ap.add_argument('--chunk-size', type=int, default=64, help="images per task")
+    ap.add_argument('--solidity-threshold', type=float, help="override SOLIDITY_THRESHOLD")
+    ap.add_argument('--roi', help="'auto' or x,y,w,h (default: full frame)")
+    ap.add_argument('--lut', action='store_true', help="use the colour lookup table mask")
+    args = ap.parse_args()
+
+    sink = ParquetSink(args.output) if args.output.endswith('.parquet') else CsvSink(args.output)
+    max_in_flight = args.workers * 2
+    done = 0
+    verdicts = {}
+    start = time.monotonic()
+    last_report = start
+
+    print(f"Re-analyzing {args.source} with {args.workers} workers -> {args.output}")
+    with cf.ProcessPoolExecutor(args.workers, initializer=init_worker,
+                                initargs=(args.solidity_threshold, parse_roi(args.roi),
+                                          args.lut)) as pool:
+        pending = set()
+
+        def collect(wait_for):
+            nonlocal done
+            finished, still = cf.wait(pending, return_when=wait_for)
+            for fut in finished:
+                rows = fut.result()
+                sink.write(rows)
+                done += len(rows)
+                for r in rows:
+                    verdicts[r['verdict']] = verdicts.get(r['verdict'], 0) + 1
+            return still
+
+        for chunk in chunked(iter_source(args.source), args.chunk_size):
+            # Bound the work in flight so archives are streamed, not loaded
+            if len(pending) >= max_in_flight:
+                pending = collect(cf.FIRST_COMPLETED)
+            pending.add(pool.submit(analyze_chunk, chunk))
+
+            now = time.monotonic()
+            if now - last_report >= 5:
+                print(f"  {done} images | {done / (now - start):.0f} images/sec")
+                last_report = now
+        if pending:
+            collect(cf.ALL_COMPLETED)
+
+    sink.close()
+    elapsed = time.monotonic() - start
+    print(f"\n✓ {done} images in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.0f} images/sec)")
+    for verdict, n in sorted(verdicts.items(), key=lambda kv: str(kv[0])):
+        print(f"  {str(verdict):16s} {n}")
+
+if __name__ == "__main__":
+    main()
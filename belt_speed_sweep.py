@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Belt Speed Sweep
+Finds how fast the belt can run in each firmware exposure mode (F/M/A) before
+motion blur and rolling-shutter skew push analyze_frame accuracy below a target:
+
+    python3 belt_speed_sweep.py --target 0.95
+    python3 belt_speed_sweep.py --modes F M --max-speed 600 --step 10
+
+Each step renders every synthetic tyre at the capture zone (at a few pixel
+phases), applies the exposure at that belt speed, JPEG-encodes and analyzes it.
+Accuracy is measured on the frames analyze_frame gets right with the belt
+stopped, so the sweep isolates what motion costs; frames the detector already
+misjudges when sharp (convex defects pass the solidity test) are reported
+and excluded.
+"""
+
+import argparse
+
+import cv2
+import numpy as np
+
+import generate_test_video as gtv
+from sync_capture_test import analyze_frame
+
+MODES = {'F': 'FAST', 'M': 'MEDIUM', 'A': 'AUTO'}
+JPEG_QUALITY = 80
+X_PHASES = (-4, -2, 0, 2, 4)  # px around the capture zone, so results don't hinge on one alignment
+
+def sharp_frames():
+    """Clean capture frames (no overlays) of every tyre centred in the capture zone"""
+    background = gtv.belt_background()
+    frames = []
+    for i, tyre in enumerate(gtv.TYRES):
+        for dx in X_PHASES:
+            frame = background.copy()
+            gtv.draw_tyre(frame, gtv.WIDTH // 2 + dx, gtv.HEIGHT // 2, tyre, i)
+            frames.append((frame, 'REJECT' if tyre['defective'] else 'ACCEPT', tyre['dot_type']))
+    return frames
+
+def analyze_all(frames, speed_mm_s, exposure):
+    speed_px = speed_mm_s * gtv.PX_PER_MM
+    params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+    results = []
+    for frame, expected, _ in frames:
+        img = gtv.apply_exposure(frame, speed_px, gtv.EXPOSURE_MS[exposure])
+        results.append(analyze_frame(cv2.imencode('.jpg', img, params)[1].tobytes(), expected))
+    return results
+
+def score(frames, speed_mm_s, exposure):
+    """Accuracy and mean solidity of the good dots at one belt speed and exposure mode"""
+    results = analyze_all(frames, speed_mm_s, exposure)
+    correct = sum(1 for r in results if r['correct'])
+    solidities = [r['solidity'] for r in results
+                  if r['expected'] == 'ACCEPT' and r.get('solidity') is not None]
+    return correct / len(frames), (np.mean(solidities) if solidities else 0.0)
+
+def tyres_per_min(speed_mm_s):
+    return speed_mm_s * gtv.PX_PER_MM * 60 / (gtv.TYRE_WIDTH_PX + gtv.TYRE_SPACING_PX)
+
+def sweep(frames, exposure, target, max_speed, step, verbose):
+    """Raise the belt speed until accuracy drops below target; return the last passing speed"""
+    passing = None
+    for speed in np.arange(0, max_speed + step / 2, step):
+        accuracy, solidity = score(frames, speed, exposure)
+        blur_px = speed * gtv.PX_PER_MM * gtv.EXPOSURE_MS[exposure] / 1000
+        if verbose:
+            print(f"  {speed:6.0f} mm/s | blur {blur_px:5.1f}px | accuracy {accuracy * 100:5.1f}% | "
+                  f"good-dot solidity {solidity:.3f}")
+        if accuracy < target:
+            break
+        passing = speed
+    return passing
+
+def main():
+    ap = argparse.ArgumentParser(description="Maximum belt speed per exposure mode")
+    ap.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['F', 'M', 'A'])
+    ap.add_argument('--target', type=float, default=0.95, help="minimum accuracy (0-1)")
+    ap.add_argument('--max-speed', type=float, default=1000, help="mm/sec")
+    ap.add_argument('--step', type=float, default=25, help="mm/sec")
+    ap.add_argument('-v', '--verbose', action='store_true', help="print every speed step")
+    args = ap.parse_args()
+
+    cv2.setNumThreads(1)
+    frames = sharp_frames()
+    sharp = analyze_all(frames, 0, 'FAST')
+    missed = sorted({f[2] for f, r in zip(frames, sharp) if not r['correct']})
+    frames = [f for f, r in zip(frames, sharp) if r['correct']]
+    print(f"{len(frames)}/{len(sharp)} frames judged correctly when sharp | "
+          f"target {args.target * 100:.0f}%")
+    if missed:
+        print(f"⚠️  Excluded (wrong even when sharp): {', '.join(missed)}")
+    print(f"Readout {gtv.READOUT_MS}ms | {gtv.PX_PER_MM:.2f} px/mm")
+    print("=" * 60)
+
+    for cmd in args.modes:
+        exposure = MODES[cmd]
+        print(f"\n{cmd} ({exposure}, {gtv.EXPOSURE_MS[exposure]}ms):")
+        best = sweep(frames, exposure, args.target, args.max_speed, args.step, args.verbose)
+        if best is None:
+            print(f"  ❌ Below target even with the belt stopped")
+        elif best >= args.max_speed:
+            print(f"  ✅ Above target up to the sweep limit ({best:.0f} mm/s)")
+        else:
+            print(f"  ✅ Max belt speed {best:.0f} mm/s ({best / 10:.1f} cm/s, "
+                  f"{tyres_per_min(best):.0f} tyres/min)")
+
+if __name__ == "__main__":
+    main()
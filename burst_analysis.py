@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Burst Analysis
+Checks whether analyzing K frames per tyre and fusing the verdicts beats a
+single frame when the belt is fast enough to blur the dot:
+
+    python3 burst_analysis.py                 # K = 1..5 at 300 mm/s, AUTO exposure
+    python3 burst_analysis.py --speed 450 -k 3
+
+Every synthetic tyre is rendered K times as the armed camera would grab it
+(one sensor period apart, each frame with its own auto-exposure time and
+noise), then scored three ways: the first frame alone, median solidity of
+the burst, and the sharpest frame of the burst. Cost is detection time per
+tyre against a single frame; each extra frame is another detect() call.
+"""
+
+import argparse
+import random
+import time
+
+import cv2
+import numpy as np
+
+import generate_test_video as gtv
+from detector import Detector, fuse
+from sim_camera import SENSOR_PERIOD
+
+JPEG_QUALITY = 80
+AEC_RANGE_MS = (8, 30)  # auto exposure settles anywhere in this range per frame
+NOISE_SIGMA = 4
+TYRE_PHASES = (-12, -4, 4, 12)  # px from the capture zone where the first frame lands
+
+def burst(tyre, index, x_start, speed_mm_s, k, rng):
+    """K decoded frames of one tyre, one sensor period apart"""
+    background = gtv.belt_background()
+    speed_px = speed_mm_s * gtv.PX_PER_MM
+    params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+    frames = []
+    for j in range(k):
+        frame = background.copy()
+        x = gtv.WIDTH // 2 + x_start - speed_px * SENSOR_PERIOD * j
+        gtv.draw_tyre(frame, int(round(x)), gtv.HEIGHT // 2, tyre, index)
+        frame = gtv.apply_exposure(frame, speed_px, rng.uniform(*AEC_RANGE_MS))
+        noise = np.empty(frame.shape, np.int16)
+        cv2.randn(noise, 0, NOISE_SIGMA)
+        frame = cv2.add(frame, noise, dtype=cv2.CV_8U)
+        jpeg = cv2.imencode('.jpg', frame, params)[1]
+        frames.append(cv2.imdecode(jpeg, cv2.IMREAD_COLOR))
+    return frames
+
+def make_bursts(speed_mm_s, k, seed=0):
+    rng = random.Random(seed)
+    cv2.setRNGSeed(seed)
+    bursts = []
+    for i, tyre in enumerate(gtv.TYRES):
+        expected = 'REJECT' if tyre['defective'] else 'ACCEPT'
+        for dx in TYRE_PHASES:
+            bursts.append((burst(tyre, i, dx, speed_mm_s, k, rng), expected))
+    return bursts
+
+def accuracy(bursts, detector, policies):
+    """Fraction correct per scoring policy ('first' = single frame)"""
+    correct = dict.fromkeys(policies, 0)
+    for frames, expected in bursts:
+        dets = detector.detect_batch(frames)
+        for policy in policies:
+            det = dets[0] if policy == 'first' else fuse(dets, frames, policy)
+            # No dot found counts as a reject, as in analyze_frame
+            correct[policy] += (det.verdict if det.found else 'REJECT') == expected
+    return {p: n / len(bursts) for p, n in correct.items()}
+
+def cost(bursts, detector, repeats=3):
+    """Best-of-repeats ms per tyre: the first frame alone vs the whole burst"""
+    single = burst = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for imgs, _ in bursts:
+            detector.detect(imgs[0])
+        single = min(single, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for imgs, _ in bursts:
+            fuse(detector.detect_batch(imgs), imgs, 'median')
+        burst = min(burst, time.perf_counter() - t0)
+    return single / len(bursts) * 1000, burst / len(bursts) * 1000
+
+def main():
+    ap = argparse.ArgumentParser(description="Burst capture: fused verdicts and their cost")
+    ap.add_argument('--speed', type=float, default=300, help="belt speed, mm/sec")
+    ap.add_argument('-k', type=int, nargs='+', default=[1, 2, 3, 5], help="frames per tyre")
+    args = ap.parse_args()
+
+    cv2.setNumThreads(1)
+    detector = Detector()
+    policies = ('first', 'median', 'best')
+    print(f"Belt {args.speed:.0f} mm/s | AEC {AEC_RANGE_MS[0]}-{AEC_RANGE_MS[1]}ms | "
+          f"{len(gtv.TYRES) * len(TYRE_PHASES)} tyre passes | frames {SENSOR_PERIOD * 1000:.0f}ms apart")
+    print("=" * 60)
+    for k in args.k:
+        bursts = make_bursts(args.speed, k)
+        acc = accuracy(bursts, detector, policies)
+        single_ms, burst_ms = cost(bursts, detector)
+        print(f"  K={k} | " + " | ".join(f"{p} {acc[p] * 100:5.1f}%" for p in policies) +
+              f" | {burst_ms:.3f} ms/tyre vs {single_ms:.3f} single frame "
+              f"({burst_ms / single_ms:.1f}x)")
+
+if __name__ == "__main__":
+    main()
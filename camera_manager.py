@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Multi-Camera Capture Manager
+Drives N ESP32-CAMs (one per USB serial adapter) from a single asyncio event
+loop. A trigger fires a capture on every camera at once; each frame is handed
+to a shared thread pool for analysis as soon as it arrives, so the next
+trigger can fire while earlier frames are still being analyzed:
+
+    manager = CameraManager({'left': '/dev/ttyUSB0', 'right': '/dev/ttyUSB1'}, analyze_frame)
+    await manager.open()
+    await manager.trigger({'expected': 'ACCEPT'})
+
+Per-camera fps, failures and parser resyncs are kept for report(). Run
+directly to benchmark 1, 2 and 4 simulated cameras.
+"""
+
+import asyncio
+import concurrent.futures as cf
+import time
+
+from async_camera import BAUD_RATE, CAPTURE_TIMEOUT, AsyncCamera
+
+class CameraStats:
+    """Capture counters and latencies for one camera"""
+
+    def __init__(self, name):
+        self.name = name
+        self.captures = 0
+        self.failures = 0
+        self.bytes = 0
+        self.latencies = []
+        self.started = time.monotonic()
+
+    def record(self, seconds, jpeg_data):
+        self.captures += 1
+        self.latencies.append(seconds)
+        if jpeg_data is None:
+            self.failures += 1
+        else:
+            self.bytes += len(jpeg_data)
+
+    def summary(self, resyncs):
+        elapsed = time.monotonic() - self.started
+        ok = self.captures - self.failures
+        lat = sorted(self.latencies) or [0.0]
+        return (f"{self.name:8s} | {ok:4d} frames | {ok / elapsed:5.2f} fps | "
+                f"failures {self.failures} | resyncs {resyncs} | "
+                f"p50 {lat[len(lat) // 2] * 1000:6.1f}ms | max {lat[-1] * 1000:6.1f}ms")
+
+class CameraManager:
+    """Owns several serial cameras; jobs are trigger dicts as used by CapturePipeline"""
+
+    def __init__(self, ports, analyze, baud=BAUD_RATE, workers=2, on_result=None,
+                 timeout=CAPTURE_TIMEOUT):
+        self.cameras = {name: AsyncCamera(port, baud) for name, port in ports.items()}
+        self.stats = {name: CameraStats(name) for name in ports}
+        self.analyze = analyze
+        self.on_result = on_result
+        self.timeout = timeout
+        self.results = []
+        # OpenCV releases the GIL, so analysis scales on threads (as in pipeline.py)
+        self._pool = cf.ThreadPoolExecutor(workers)
+        self._pending = set()
+
+    async def open(self):
+        await asyncio.gather(*(camera.open() for camera in self.cameras.values()))
+        for stats in self.stats.values():
+            stats.started = time.monotonic()
+        return self
+
+    async def close(self):
+        """Wait for outstanding analysis, then release the ports and the pool"""
+        await self.drain()
+        for camera in self.cameras.values():
+            camera.close()
+        self._pool.shutdown()
+        return self.results
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def trigger(self, job):
+        """Capture on every camera in parallel; returns once all frames are in"""
+        job['submitted'] = time.monotonic()
+        await asyncio.gather(*(self._capture(name, camera, job)
+                               for name, camera in self.cameras.items()))
+
+    async def drain(self):
+        if self._pending:
+            await asyncio.gather(*self._pending)
+
+    async def _capture(self, name, camera, job):
+        t0 = time.monotonic()
+        jpeg_data = await camera.capture(self.timeout)
+        self.stats[name].record(time.monotonic() - t0, jpeg_data)
+        task = asyncio.create_task(self._analyze(name, job, jpeg_data))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _analyze(self, name, job, jpeg_data):
+        if jpeg_data is None:
+            result = {'error': 'capture_failed', 'correct': False}
+        else:
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self._pool, self.analyze,
+                                                    jpeg_data, job.get('expected'))
+            except Exception as e:
+                result = {'error': f"analyze_failed: {e}", 'correct': False}
+        result['camera'] = name
+        result['trigger'] = job
+        self.results.append(result)
+        if self.on_result:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                print(f"⚠️ Result callback failed: {e}")
+
+    def report(self):
+        print("Per-camera capture stats:")
+        for name, stats in self.stats.items():
+            print(f"  {stats.summary(self.cameras[name].parser.resyncs)}")
+
+async def run_benchmark(ports, baud, triggers, analyze):
+    async with CameraManager(ports, analyze, baud) as manager:
+        start = time.monotonic()
+        for _ in range(triggers):
+            await manager.trigger({'expected': None})
+        await manager.drain()
+        elapsed = time.monotonic() - start
+        manager.report()
+    frames = sum(s.captures - s.failures for s in manager.stats.values())
+    return frames / elapsed
+
+def main():
+    from sim_camera import SimulatedCamera, load_frames
+    from sync_capture_test import analyze_frame
+
+    frames = load_frames()
+    triggers = 12
+    baseline = None
+    for n in (1, 2, 4):
+        sims = [SimulatedCamera(frames).start() for _ in range(n)]
+        try:
+            ports = {f"cam{i}": sim.port for i, sim in enumerate(sims)}
+            print(f"\n{n} camera(s), {triggers} triggers:")
+            fps = asyncio.run(run_benchmark(ports, sims[0].baud, triggers, analyze_frame))
+        finally:
+            for sim in sims:
+                sim.stop()
+        baseline = baseline or fps
+        print(f"  Total {fps:5.2f} fps | {fps / baseline:4.2f}x one camera "
+              f"({fps / baseline / n * 100:.0f}% of linear)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Colour Mask Lookup Table
+Precomputes the yellow/red paint mask for every one of the 2^24 BGR colours,
+so building a mask is a single gather per pixel instead of cvtColor(BGR2HSV)
+plus three inRange calls and two ORs. The table (16 MB) is rebuilt on the
+next mask whenever the HSV ranges it was built from change.
+"""
+
+import threading
+
+import numpy as np
+import cv2
+
+class ColourMaskLUT:
+    """BGR -> {0, 255} paint mask via a full 24-bit lookup table"""
+
+    def __init__(self, hsv_ranges):
+        # Keep a reference: callers may edit the ranges in place (calibration)
+        self.hsv_ranges = hsv_ranges
+        self.table = None
+        self.builds = 0
+        self._key = None
+        self._lock = threading.Lock()
+        self._local = threading.local()  # per-thread scratch buffers
+
+    def _ranges_key(self):
+        return tuple((tuple(lo), tuple(hi)) for lo, hi in self.hsv_ranges)
+
+    def _build(self, key):
+        """Evaluate the HSV thresholds once for every colour"""
+        # Laid out so that a BGRA pixel read as little-endian uint32 (alpha
+        # cleared) is its own index: b | g << 8 | r << 16
+        v = np.arange(256, dtype=np.uint8)
+        r, g, b = np.meshgrid(v, v, v, indexing='ij')
+        grid = np.stack([b, g, r], axis=-1).reshape(4096, 4096, 3)
+        hsv = cv2.cvtColor(grid, cv2.COLOR_BGR2HSV)
+        mask = np.zeros(hsv.shape[:2], np.uint8)
+        for lo, hi in key:
+            mask |= cv2.inRange(hsv, lo, hi)
+        self.table = mask.reshape(-1)
+        self._key = key
+        self.builds += 1
+
+    def apply(self, img):
+        """Return the combined paint mask for a BGR image (or ROI view of one)"""
+        key = self._ranges_key()
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._build(key)
+
+        h, w = img.shape[:2]
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        if (h, w) not in buffers:
+            buffers[(h, w)] = (np.empty((h, w, 4), np.uint8), np.empty((h, w), np.uint8))
+        bgra, mask = buffers[(h, w)]
+
+        cv2.cvtColor(img, cv2.COLOR_BGR2BGRA, dst=bgra)
+        idx = bgra.view(np.uint32)[..., 0]
+        np.bitwise_and(idx, 0xFFFFFF, out=idx)
+        return np.take(self.table, idx, out=mask)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Paint Dot Detector
+The one implementation of the paint dot check, shared by the capture
+scripts, the pipeline, batch re-analysis and the Pi template:
+
+    detector = Detector()                      # or Detector(min_area=100, roi=...)
+    det = detector.detect_jpeg(jpeg_data)      # Detection(found, verdict, solidity, ...)
+
+Everything that depends only on the configuration is prepared once: the
+morphology kernel, the HSV threshold tuples and, per thread and per image
+size, the HSV, mask and scratch buffers that OpenCV writes into. Steady-state
+detection therefore allocates almost nothing per frame. Run directly to
+compare latency and per-frame allocations against the per-call version.
+"""
+
+import collections
+import threading
+
+import cv2
+import numpy as np
+
+from metrics import METRICS
+
+# Paint colours as HSV (low, high) ranges: yellow, then red either side of hue 0
+PAINT_HSV_RANGES = [
+    ((15, 60, 60), (45, 255, 255)),
+    ((0, 100, 100), (10, 255, 255)),
+    ((160, 100, 100), (180, 255, 255)),
+]
+
+# Detection thresholds
+SOLIDITY_THRESHOLD = 0.92
+MIN_DOT_AREA = 50  # px at full resolution
+KERNEL_SIZE = 5  # morphology kernel at full resolution
+
+# center and size are (x, y) and (w, h) in full-frame pixels; image_size is (w, h)
+Detection = collections.namedtuple(
+    'Detection', 'found verdict solidity area circularity center size image_size roi')
+
+class Detector:
+    """Paint dot detection for one configuration; safe to share between threads"""
+
+    def __init__(self, hsv_ranges=PAINT_HSV_RANGES, solidity_threshold=SOLIDITY_THRESHOLD,
+                 min_area=MIN_DOT_AREA, kernel_size=KERNEL_SIZE, roi=None, lut=None):
+        self.ranges = [(tuple(int(v) for v in lo), tuple(int(v) for v in hi))
+                       for lo, hi in hsv_ranges]
+        self.solidity_threshold = solidity_threshold
+        self.min_area = min_area
+        self.kernel = np.ones((kernel_size, kernel_size), np.uint8)
+        self.roi = roi  # (x, y, w, h) or None for the full frame
+        self.lut = lut  # ColourMaskLUT replacing HSV + inRange, if given
+        self._local = threading.local()  # per-thread buffers, keyed by ROI size
+
+    def _buffers(self, h, w):
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        if (h, w) not in buffers:
+            buffers[(h, w)] = (np.empty((h, w, 3), np.uint8),
+                               np.empty((h, w), np.uint8), np.empty((h, w), np.uint8))
+        return buffers[(h, w)]
+
+    def detect_jpeg(self, jpeg_data, roi=None):
+        """Decode and detect; None if the JPEG does not decode"""
+        with METRICS.stage('decode'):
+            img = cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        return self.detect(img, roi)
+
+    def detect(self, img, roi=None):
+        """Detect the dot in a BGR image, inside roi (default: the configured ROI)"""
+        h, w = img.shape[:2]
+        roi = roi or self.roi
+        x0, y0 = 0, 0
+        view = img
+        if roi is not None:
+            x0, y0, rw, rh = roi
+            view = img[y0:y0 + rh, x0:x0 + rw]
+        hsv, mask, scratch = self._buffers(*view.shape[:2])
+
+        with METRICS.stage('mask'):
+            if self.lut is not None:
+                colour = self.lut.apply(view)
+            else:
+                cv2.cvtColor(view, cv2.COLOR_BGR2HSV, dst=hsv)
+                colour = cv2.inRange(hsv, *self.ranges[0], dst=mask)
+                for lo, hi in self.ranges[1:]:
+                    cv2.bitwise_or(mask, cv2.inRange(hsv, lo, hi, dst=scratch), dst=mask)
+
+        with METRICS.stage('morphology'):
+            cv2.morphologyEx(colour, cv2.MORPH_CLOSE, self.kernel, dst=scratch)
+            cv2.morphologyEx(scratch, cv2.MORPH_OPEN, self.kernel, dst=mask)
+
+        # Offset maps ROI contours back to full-frame coordinates
+        with METRICS.stage('contours'):
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE,
+                                           offset=(x0, y0))
+        return self._measure(contours, (w, h), roi)
+
+    def detect_batch(self, imgs, roi=None):
+        """detect() on each frame of a burst; returns a Detection per frame
+
+        Stacking the burst into one tall image to threshold and run morphology
+        once measured slower than separate calls (0.87-0.91x at K=3) and changed
+        erosion at the ROI's top and bottom edges, so frames are detected one by
+        one with the same per-thread buffers.
+        """
+        return [self.detect(img, roi) for img in imgs]
+
+    def _measure(self, contours, image_size, roi):
+        """Detection for the largest contour, or NO_DOT"""
+        if contours:
+            largest = max(contours, key=cv2.contourArea)
+            area = cv2.contourArea(largest)
+            if area > self.min_area:
+                perimeter = cv2.arcLength(largest, True)
+                x, y, cw, ch = cv2.boundingRect(largest)
+                circularity = 4 * np.pi * area / (perimeter ** 2) if perimeter > 0 else 0
+                hull_area = cv2.contourArea(cv2.convexHull(largest))
+                solidity = area / hull_area if hull_area > 0 else 0
+                verdict = 'ACCEPT' if solidity >= self.solidity_threshold else 'REJECT'
+                return Detection(True, verdict, solidity, area, circularity,
+                                 (x + cw // 2, y + ch // 2), (cw, ch), image_size, roi)
+        return Detection(False, 'NO_DOT', None, None, None, None, None, image_size, roi)
+
+def sharpness(img, det):
+    """Variance of the Laplacian over the dot's bounding box (higher = less blurred)"""
+    cx, cy = det.center
+    cw, ch = det.size
+    x, y = max(0, cx - cw // 2), max(0, cy - ch // 2)
+    patch = cv2.cvtColor(img[y:y + ch, x:x + cw], cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(patch, cv2.CV_32F).var()
+
+def fuse(detections, imgs=None, policy='median', solidity_threshold=SOLIDITY_THRESHOLD):
+    """One Detection for a burst of the same tyre
+
+    median  verdict from the median solidity of the frames that found a dot;
+            reports the frame closest to that median
+    best    the sharpest frame's detection (needs imgs)
+    """
+    found = [d for d in detections if d.found]
+    if not found:
+        return detections[0]
+    if policy == 'best':
+        pairs = [(d, img) for d, img in zip(detections, imgs) if d.found]
+        return max(pairs, key=lambda pair: sharpness(pair[1], pair[0]))[0]
+    median = float(np.median([d.solidity for d in found]))
+    nearest = min(found, key=lambda d: abs(d.solidity - median))
+    verdict = 'ACCEPT' if median >= solidity_threshold else 'REJECT'
+    return nearest._replace(solidity=median, verdict=verdict)
+
+def as_result(det, expected):
+    """The result dict the capture scripts log and report, scored against expected"""
+    w, h = det.image_size
+    result = {
+        'image_size': f'{w}x{h}',
+        'roi': det.roi,
+        'expected': expected,
+        'dot_found': False,
+        'verdict': 'NO_DOT',
+        'correct': False
+    }
+    if det.found:
+        cw, ch = det.size
+        result.update({
+            'dot_found': True,
+            'dot_size': f'{cw}x{ch}',
+            'dot_center': det.center,
+            'area': int(det.area),
+            'circularity': round(det.circularity, 3),
+            'solidity': round(det.solidity, 3),
+            'verdict': det.verdict,
+            'correct': det.verdict == expected
+        })
+
+    # Handle 'none' dot type - should be REJECT
+    if not det.found and expected == 'REJECT':
+        result['correct'] = True
+        result['verdict'] = 'REJECT (no dot)'
+    return result
+
+def legacy_analyze(img, min_area=MIN_DOT_AREA):
+    """The per-call version every script used to carry, for comparison"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = None
+    for lo, hi in PAINT_HSV_RANGES:
+        colour_mask = cv2.inRange(hsv, lo, hi)
+        mask = colour_mask if mask is None else mask | colour_mask
+    kernel = np.ones((KERNEL_SIZE, KERNEL_SIZE), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return 'NO_DOT'
+    largest = max(contours, key=cv2.contourArea)
+    area = cv2.contourArea(largest)
+    if area <= min_area:
+        return 'NO_DOT'
+    hull_area = cv2.contourArea(cv2.convexHull(largest))
+    solidity = area / hull_area if hull_area > 0 else 0
+    return 'ACCEPT' if solidity >= SOLIDITY_THRESHOLD else 'REJECT'
+
+def main():
+    import time
+    import tracemalloc
+
+    import detector_benchmark as db
+
+    frames = db.synthetic_frames()
+    db.decode_all(frames)
+    imgs = [f['img'] for f in frames]
+    detector = Detector()
+    METRICS.enabled = False  # measure the detector alone
+
+    variants = [('per-call', legacy_analyze), ('Detector', lambda img: detector.detect(img).verdict)]
+    same = sum(legacy_analyze(img) == detector.detect(img).verdict for img in imgs)
+    print(f"{len(imgs)} VGA frames | verdicts identical on {same}/{len(imgs)}")
+    print("=" * 60)
+
+    for name, fn in variants:
+        fn(imgs[0])  # warm up (buffers, lazy imports)
+        best = float('inf')
+        for _ in range(5):
+            t0 = time.perf_counter()
+            for img in imgs:
+                fn(img)
+            best = min(best, time.perf_counter() - t0)
+
+        # Peak memory allocated while analyzing one frame, above what was live before
+        tracemalloc.start()
+        peak = 0
+        for img in imgs:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(img)
+            peak += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        print(f"  {name:9s} | {best / len(imgs) * 1000:6.3f} ms/frame | "
+              f"peak {peak / len(imgs) / 1024:7.1f} KB allocated per frame")
+
+if __name__ == "__main__":
+    main()
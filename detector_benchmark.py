@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Detector Benchmark
+Times paint dot detection variants on labelled frames from the synthetic
+conveyor and checks they agree with the full-frame analyze_frame:
+
+    python3 detector_benchmark.py roi
+    python3 detector_benchmark.py lut
+    python3 detector_benchmark.py reduced
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import generate_test_video as gtv
+from colour_lut import ColourMaskLUT
+from sync_capture_test import (CENTRE_BAND_ROI, PAINT_HSV_RANGES, AdaptiveDecoder,
+                               analyze_frame, analyze_image, find_tyre_roi)
+
+JPEG_QUALITY = 80
+TOTAL_FRAMES = 800  # long enough for all 10 tyres to cross the capture zone
+
+def crossing_frames():
+    """(frame_num, tyre_index) where each tyre centre crosses the capture zone"""
+    positions = gtv.tyre_start_positions()
+    crossings = []
+    for i in range(len(gtv.TYRES)):
+        for frame_num in range(TOTAL_FRAMES):
+            x_pos = positions[i] - frame_num * gtv.BELT_SPEED_PX_PER_FRAME
+            if abs(x_pos - gtv.WIDTH // 2) < gtv.BELT_SPEED_PX_PER_FRAME:
+                crossings.append((frame_num, i))
+                break
+    return crossings
+
+def synthetic_frames(span=2):
+    """JPEG frames around every capture-zone crossing, labelled with the expected verdict"""
+    positions = gtv.tyre_start_positions()
+    params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+    frames = []
+    for frame_num, i in crossing_frames():
+        for f in range(frame_num - span, frame_num + span + 1):
+            img = gtv.render_frame(f, positions)
+            frames.append({
+                'frame': f,
+                'tyre_index': i,
+                'expected': 'REJECT' if gtv.TYRES[i]['defective'] else 'ACCEPT',
+                'jpeg': cv2.imencode('.jpg', img, params)[1].tobytes(),
+            })
+    return frames
+
+def time_per_frame(frames, fn, repeats, reset=None):
+    """Best-of-repeats mean time per frame (ms) and the results of the last pass"""
+    best = float('inf')
+    for _ in range(repeats):
+        if reset:
+            reset()
+        t0 = time.perf_counter()
+        results = [fn(f) for f in frames]
+        best = min(best, time.perf_counter() - t0)
+    return best / len(frames) * 1000, results
+
+def agreement(results, baseline):
+    """Fraction of frames whose verdict matches the baseline"""
+    same = sum(1 for r, b in zip(results, baseline) if r['verdict'] == b['verdict'])
+    return same / len(baseline)
+
+def decode_all(frames):
+    """Attach decoded images so benchmarks can time the analysis stages alone"""
+    for f in frames:
+        f['img'] = cv2.imdecode(np.frombuffer(f['jpeg'], np.uint8), cv2.IMREAD_COLOR)
+
+def bench_roi(frames, repeats):
+    """Full frame vs static centre band vs per-tyre ROI from the rubber ellipse"""
+    decode_all(frames)
+
+    # Dynamic ROI is found once per tyre, on the first frame of its burst
+    tyre_rois = {}
+    def tyre_roi(f):
+        if f['tyre_index'] not in tyre_rois:
+            tyre_rois[f['tyre_index']] = find_tyre_roi(f['img'])
+        return analyze_image(f['img'], f['expected'], tyre_rois[f['tyre_index']])
+
+    base_ms, baseline = time_per_frame(
+        frames, lambda f: analyze_image(f['img'], f['expected']), repeats)
+    print(f"  {'full frame':12s} {base_ms:6.3f} ms/frame")
+
+    modes = [
+        ('centre band', lambda f: analyze_image(f['img'], f['expected'], CENTRE_BAND_ROI), None),
+        ('tyre ellipse', tyre_roi, tyre_rois.clear),
+    ]
+    for name, fn, reset in modes:
+        ms, results = time_per_frame(frames, fn, repeats, reset)
+        print(f"  {name:12s} {ms:6.3f} ms/frame | {base_ms / ms:4.1f}x | "
+              f"agreement {agreement(results, baseline) * 100:.0f}%")
+
+def hsv_mask(img):
+    """The colour mask exactly as analyze_image builds it without a LUT"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = None
+    for lo, hi in PAINT_HSV_RANGES:
+        colour_mask = cv2.inRange(hsv, lo, hi)
+        mask = colour_mask if mask is None else mask | colour_mask
+    return mask
+
+def bench_lut(frames, repeats):
+    """HSV + inRange masks vs the fused 24-bit lookup table"""
+    decode_all(frames)
+    t0 = time.perf_counter()
+    lut = ColourMaskLUT(PAINT_HSV_RANGES)
+    lut.apply(frames[0]['img'])
+    print(f"  LUT build: {(time.perf_counter() - t0) * 1000:.0f} ms (16 MB table)")
+
+    # Accuracy: masks must match pixel for pixel, on frames and on every colour
+    diff = sum(int(np.count_nonzero(hsv_mask(f['img']) != lut.apply(f['img']))) for f in frames)
+    v = np.arange(256, dtype=np.uint8)
+    r, g, b = np.meshgrid(v, v, v, indexing='ij')
+    grid = np.stack([b, g, r], axis=-1).reshape(4096, 4096, 3)
+    colour_diff = int(np.count_nonzero(hsv_mask(grid) != lut.apply(grid)))
+    print(f"  Mask mismatches: {diff} px over {len(frames)} frames | "
+          f"{colour_diff} of 16.7M colours")
+
+    hsv_ms, _ = time_per_frame(frames, lambda f: hsv_mask(f['img']), repeats)
+    lut_ms, _ = time_per_frame(frames, lambda f: lut.apply(f['img']), repeats)
+    print(f"  Mask only:    HSV {hsv_ms:6.3f} ms | LUT {lut_ms:6.3f} ms | {hsv_ms / lut_ms:4.1f}x")
+
+    base_ms, baseline = time_per_frame(
+        frames, lambda f: analyze_image(f['img'], f['expected']), repeats)
+    ms, results = time_per_frame(
+        frames, lambda f: analyze_image(f['img'], f['expected'], lut=lut), repeats)
+    print(f"  analyze_image: HSV {base_ms:6.3f} ms | LUT {ms:6.3f} ms | {base_ms / ms:4.1f}x | "
+          f"agreement {agreement(results, baseline) * 100:.0f}%")
+
+    # Editing the thresholds in place triggers a rebuild on the next mask
+    ranges = [list(r) for r in PAINT_HSV_RANGES]
+    lut = ColourMaskLUT(ranges)
+    lut.apply(frames[0]['img'])
+    ranges[0] = ((20, 60, 60), (45, 255, 255))
+    lut.apply(frames[0]['img'])
+    print(f"  Threshold edit -> rebuilds: {lut.builds}")
+
+def bench_reduced(frames, repeats):
+    """Full VGA decode vs IMREAD_REDUCED_* first pass with full-resolution fallback"""
+    base_ms, baseline = time_per_frame(
+        frames, lambda f: analyze_frame(f['jpeg'], f['expected']), repeats)
+    print(f"  {'full decode':14s} {base_ms:6.3f} ms/frame (decode + analyze)")
+    for scale in (2, 4):
+        decoder = AdaptiveDecoder(scale)
+        ms, results = time_per_frame(
+            frames, lambda f: decoder.analyze(f['jpeg'], f['expected']), repeats, decoder.reset)
+        full = sum(1 for r in results if r['decode_scale'] == 1)
+        print(f"  {f'reduced 1/{scale}':14s} {ms:6.3f} ms/frame | {base_ms / ms:4.1f}x | "
+              f"agreement {agreement(results, baseline) * 100:.0f}% | "
+              f"full decodes {full}/{len(frames)}")
+        decoder.report(base_ms)
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark paint dot detection variants")
+    ap.add_argument('mode', choices=['roi', 'lut', 'reduced'])
+    ap.add_argument('--repeats', type=int, default=5)
+    ap.add_argument('--threads', type=int, default=1, help="OpenCV threads (Pi pipeline workers use 1)")
+    args = ap.parse_args()
+
+    cv2.setNumThreads(args.threads)
+    frames = synthetic_frames()
+    print(f"{len(frames)} frames from {len(gtv.TYRES)} synthetic tyres, "
+          f"{args.threads} OpenCV thread(s)")
+    print("=" * 60)
+    if args.mode == 'roi':
+        bench_roi(frames, args.repeats)
+    elif args.mode == 'lut':
+        bench_lut(frames, args.repeats)
+    elif args.mode == 'reduced':
+        bench_reduced(frames, args.repeats)
+
+if __name__ == "__main__":
+    main()
@@ -66,10 +66,19 @@ const uint8_t frameEndMarker[] = {FRAME_END_MARKER};
 uint32_t frameCount = 0;
 uint32_t lastFrameTime = 0;
 
+// Pre-armed capture ('P'): a grab task keeps the latest frame ready so 'X'
+// only has to transfer it. Timestamps are esp_timer microseconds.
+volatile bool armed = false;
+TaskHandle_t grabTaskHandle = NULL;
+SemaphoreHandle_t fbMutex = NULL;
+camera_fb_t *heldFb = NULL;       // latest complete frame, owned by the grab task
+volatile int64_t heldFbUs = 0;
+int64_t framePeriodUs = 40000;    // measured between armed frames
+
 // =============================================================================
 // CAMERA INITIALIZATION
 // =============================================================================
-bool initCamera() {
+bool initCamera(bool doubleBuffered) {
   camera_config_t config;
   config.ledc_channel = LEDC_CHANNEL_0;
   config.ledc_timer = LEDC_TIMER_0;
@@ -93,9 +102,14 @@ bool initCamera() {
   config.pixel_format = PIXFORMAT_JPEG;
   config.frame_size = FRAME_SIZE;
   config.jpeg_quality = JPEG_QUALITY;
-  config.fb_count = 1;  // Single buffer for triggered capture (prevents overflow)
   config.fb_location = CAMERA_FB_IN_PSRAM;
-  config.grab_mode = CAMERA_GRAB_WHEN_EMPTY;  // Only capture when buffer is free
+  if (doubleBuffered) {
+    config.fb_count = 2;  // One held for the next trigger, one being filled
+    config.grab_mode = CAMERA_GRAB_LATEST;  // Always overwrite with the newest frame
+  } else {
+    config.fb_count = 1;  // Single buffer for triggered capture (prevents overflow)
+    config.grab_mode = CAMERA_GRAB_WHEN_EMPTY;  // Only capture when buffer is free
+  }
 
   // Initialize camera
   esp_err_t err = esp_camera_init(&config);
@@ -138,14 +152,7 @@ bool initCamera() {
 // =============================================================================
 // CAPTURE AND SEND FRAME
 // =============================================================================
-void captureAndSendFrame() {
-  // Capture frame
-  camera_fb_t *fb = esp_camera_fb_get();
-  if (!fb) {
-    Serial.println("ERROR:CAPTURE_FAILED");
-    return;
-  }
-
+void sendFrame(camera_fb_t *fb) {
   // Blink LED to indicate capture
   digitalWrite(LED_GPIO_NUM, HIGH);
 
@@ -185,11 +192,124 @@ void captureAndSendFrame() {
     frameCount = 0;
     lastFrameTime = now;
   }
+}
+
+void captureAndSendFrame() {
+  // Capture frame
+  camera_fb_t *fb = esp_camera_fb_get();
+  if (!fb) {
+    Serial.println("ERROR:CAPTURE_FAILED");
+    return;
+  }
+  sendFrame(fb);
 
   // Return frame buffer
   esp_camera_fb_return(fb);
 }
 
+// =============================================================================
+// PRE-ARMED CAPTURE (double-buffered grab)
+// =============================================================================
+int64_t frameTimeUs(camera_fb_t *fb) {
+  return (int64_t)fb->timestamp.tv_sec * 1000000LL + fb->timestamp.tv_usec;
+}
+
+// Runs on core 0 while armed: keep only the newest frame, return the rest
+void grabTask(void *arg) {
+  while (armed) {
+    camera_fb_t *fb = esp_camera_fb_get();  // blocks until the next frame
+    if (!fb) continue;
+    if (!armed) {
+      esp_camera_fb_return(fb);
+      break;
+    }
+    xSemaphoreTake(fbMutex, portMAX_DELAY);
+    if (heldFb) {
+      framePeriodUs = frameTimeUs(fb) - heldFbUs;
+      esp_camera_fb_return(heldFb);
+    }
+    heldFb = fb;
+    heldFbUs = frameTimeUs(fb);
+    xSemaphoreGive(fbMutex);
+  }
+  grabTaskHandle = NULL;
+  vTaskDelete(NULL);
+}
+
+// Re-initialize the driver, keeping the sensor settings chosen by R/V/F/M/A
+bool reinitCamera(bool doubleBuffered) {
+  sensor_t *s = esp_camera_sensor_get();
+  camera_status_t saved = s->status;
+  esp_camera_deinit();
+  if (!initCamera(doubleBuffered)) {
+    return false;
+  }
+  s = esp_camera_sensor_get();
+  s->set_framesize(s, (framesize_t)saved.framesize);
+  s->set_exposure_ctrl(s, saved.aec);
+  s->set_aec_value(s, saved.aec_value);
+  s->set_gain_ctrl(s, saved.agc);
+  s->set_agc_gain(s, saved.agc_gain);
+  return true;
+}
+
+void armCapture() {
+  if (!armed) {
+    if (!fbMutex) fbMutex = xSemaphoreCreateMutex();
+    if (!reinitCamera(true)) {
+      Serial.println("ERROR:ARM_FAILED");
+      return;
+    }
+    armed = true;
+    xTaskCreatePinnedToCore(grabTask, "grab", 4096, NULL, 5, &grabTaskHandle, 0);
+  }
+  Serial.println("ARMED");
+}
+
+void disarmCapture() {
+  if (armed) {
+    armed = false;
+    while (grabTaskHandle != NULL) delay(1);  // finishes within one frame period
+    if (heldFb) {
+      esp_camera_fb_return(heldFb);
+      heldFb = NULL;
+    }
+    reinitCamera(false);
+  }
+  Serial.println("DISARMED");
+}
+
+// Send the held frame, or the next one if it will land closer to the trigger
+void fireArmedCapture() {
+  int64_t fireUs = esp_timer_get_time();
+
+  xSemaphoreTake(fbMutex, portMAX_DELAY);
+  int64_t heldUs = heldFbUs;
+  bool waitForNext = heldFb == NULL || fireUs - heldUs > framePeriodUs / 2;
+  int64_t period = framePeriodUs;
+  xSemaphoreGive(fbMutex);
+
+  if (waitForNext) {
+    int64_t giveUp = fireUs + 2 * period;
+    while (heldFbUs == heldUs && esp_timer_get_time() < giveUp) delay(1);
+  }
+
+  // Take ownership so the grab task cannot return it while it is sent
+  xSemaphoreTake(fbMutex, portMAX_DELAY);
+  camera_fb_t *fb = heldFb;
+  heldFb = NULL;
+  xSemaphoreGive(fbMutex);
+  if (!fb) {
+    Serial.println("ERROR:CAPTURE_FAILED");
+    return;
+  }
+
+  // Frame time relative to the trigger (negative = captured before it)
+  Serial.printf("FRAME_TS:%lld\n", frameTimeUs(fb) - fireUs);
+  sendFrame(fb);
+  esp_camera_fb_return(fb);
+}
+
 // =============================================================================
 // COMMAND PROCESSING
 // =============================================================================
@@ -197,7 +317,30 @@ void processCommand(char cmd) {
   switch (cmd) {
     case 'C':  // Capture single frame
     case 'c':
-      captureAndSendFrame();
+      if (armed) {
+        fireArmedCapture();
+      } else {
+        captureAndSendFrame();
+      }
+      break;
+      
+    case 'P':  // Pre-arm: double-buffered continuous grab
+    case 'p':
+      armCapture();
+      break;
+      
+    case 'D':  // Disarm: back to single-buffer triggered capture
+    case 'd':
+      disarmCapture();
+      break;
+      
+    case 'X':  // Fire: send the armed frame nearest to now
+    case 'x':
+      if (armed) {
+        fireArmedCapture();
+      } else {
+        captureAndSendFrame();
+      }
       break;
       
     case 'S':  // Status check
@@ -301,7 +444,7 @@ void setup() {
   
   // Initialize camera
   Serial.println("# Initializing camera...");
-  if (!initCamera()) {
+  if (!initCamera(false)) {
     Serial.println("ERROR:CAMERA_INIT_FAILED");
     // Blink LED rapidly to indicate error
     while (true) {
@@ -313,7 +456,8 @@ void setup() {
   }
   
   Serial.println("STATUS:READY");
-  Serial.println("# Commands: C=capture, S=status, R=QVGA, V=VGA, L=LED on, O=LED off");
+  Serial.println("# Commands: C=capture, S=status, R=QVGA, V=VGA, L=LED on, O=LED off, "
+                 "P=arm, X=fire, D=disarm");
   
   lastFrameTime = millis();
 }
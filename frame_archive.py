@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Frame Archive
+Append-only store for captured JPEGs: a directory of large segment files
+plus a compact offset index per segment, instead of one small file (and
+one inode and fsync) per capture:
+
+    archive = FrameArchive("capture_test/frames")
+    key = archive.append(jpeg_data)            # straight from the capture buffer
+    view = archive.get(key)                    # zero-copy memoryview over an mmap
+    archive.close()
+
+    python3 frame_archive.py stats capture_test/frames
+    python3 frame_archive.py export capture_test/frames out/ [--since ISO] [--until ISO]
+    python3 frame_archive.py bench             # loose files vs archive
+
+Frames are keyed by content hash (the same BLAKE2b key the results store
+uses), so a repeated frame is stored once. Segments rotate at SEGMENT_BYTES;
+whole segments are deleted oldest first once the archive exceeds its size
+or age limit. Every record carries its own header, so a segment whose index
+is behind after a power cut is re-indexed on open and a torn tail is cut off.
+
+Segment record: [MAGIC][length u32][ts f64][key 16 bytes][JPEG]
+Index entry:    [key 16 bytes][offset u64][length u32][ts f64]
+"""
+
+import argparse
+import datetime
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+SEGMENT_BYTES = 64 * 1024 * 1024
+MAX_BYTES = 8 * 1024 ** 3  # retention: total archive size
+MAX_AGE_DAYS = 30  # retention: segments whose newest frame is older are deleted
+SYNC_INTERVAL = 1.0  # s between fsyncs of the active segment (0 = every frame)
+MAGIC = b'TYF1'
+RECORD = struct.Struct('<4sId16s')  # magic, length, ts, key
+ENTRY = struct.Struct('<16sQId')  # key, offset of the JPEG, length, ts
+SEGMENT_SUFFIX, INDEX_SUFFIX = '.seg', '.idx'
+
+def frame_key(jpeg):
+    return hashlib.blake2b(jpeg, digest_size=16).digest()
+
+class Segment:
+    """One segment file and its index, mapped read-only on demand"""
+
+    def __init__(self, directory, number):
+        self.number = number
+        base = os.path.join(directory, f"{number:08d}")
+        self.path, self.index_path = base + SEGMENT_SUFFIX, base + INDEX_SUFFIX
+        self.entries = []  # (key, offset, length, ts)
+        self.size = 0
+        self._map = None
+
+    def load(self):
+        """Read the index, then re-index or truncate whatever the segment has beyond it"""
+        with open(self.index_path, 'ab+') as f:
+            f.seek(0)
+            data = f.read()
+        whole = len(data) - len(data) % ENTRY.size
+        self.entries = [ENTRY.unpack_from(data, i) for i in range(0, whole, ENTRY.size)]
+        size = os.path.getsize(self.path)
+        # Index entries pointing past the segment end were written ahead of a lost tail
+        while self.entries and self.entries[-1][1] + self.entries[-1][2] > size:
+            self.entries.pop()
+        pos = self.entries[-1][1] + self.entries[-1][2] if self.entries else 0
+        recovered = []
+        with open(self.path, 'rb') as f:
+            f.seek(pos)
+            while True:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    break
+                magic, length, ts, key = RECORD.unpack(header)
+                if magic != MAGIC or pos + RECORD.size + length > size:
+                    break
+                recovered.append((key, pos + RECORD.size, length, ts))
+                pos += RECORD.size + length
+                f.seek(pos)
+        if pos < size:
+            os.truncate(self.path, pos)  # torn record from a crash mid-write
+        self.entries += recovered
+        self.size = pos
+        if recovered or whole != len(data) or len(self.entries) * ENTRY.size != whole:
+            with open(self.index_path, 'wb') as f:
+                f.write(b''.join(ENTRY.pack(*e) for e in self.entries))
+        return len(recovered)
+
+    def view(self, offset, length):
+        """memoryview of one frame; remaps when the segment has grown past the mapping"""
+        if self._map is None or offset + length > len(self._map):
+            self.release()
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[offset:offset + length]
+
+    def release(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a caller still holds a view; the mapping closes with it
+            self._map = None
+
+    def newest(self):
+        return self.entries[-1][3] if self.entries else 0
+
+class FrameArchive:
+    """Append-only segmented JPEG store; append from one thread, read from any"""
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, max_bytes=MAX_BYTES,
+                 max_age_days=MAX_AGE_DAYS, sync_interval=SYNC_INTERVAL, readonly=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.sync_interval = sync_interval
+        self.readonly = readonly
+        self.stats = {'appended': 0, 'deduplicated': 0, 'recovered': 0, 'deleted_segments': 0}
+        self._lock = threading.Lock()
+        self._keys = {}  # key -> (segment, offset, length)
+        self._fd = self._index_fd = None
+        self._last_sync = 0.0
+        os.makedirs(directory, exist_ok=True)
+        numbers = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                         if name.endswith(SEGMENT_SUFFIX))
+        self.segments = [Segment(directory, n) for n in numbers]
+        for seg in self.segments:
+            if readonly:
+                self._read_index(seg)
+            else:
+                self.stats['recovered'] += seg.load()
+            for key, offset, length, _ in seg.entries:
+                self._keys[key] = (seg, offset, length)
+        if not readonly:
+            self._open_active(self.segments[-1] if self.segments else self._new_segment())
+
+    def _read_index(self, seg):
+        with open(seg.index_path, 'rb') as f:
+            data = f.read()
+        seg.entries = [ENTRY.unpack_from(data, i)
+                       for i in range(0, len(data) - len(data) % ENTRY.size, ENTRY.size)]
+        seg.size = os.path.getsize(seg.path)
+
+    def _new_segment(self):
+        number = self.segments[-1].number + 1 if self.segments else 0
+        seg = Segment(self.directory, number)
+        open(seg.path, 'ab').close()
+        open(seg.index_path, 'ab').close()
+        self.segments.append(seg)
+        return seg
+
+    def _open_active(self, seg):
+        self.active = seg
+        self._fd = os.open(seg.path, os.O_WRONLY | os.O_APPEND)
+        self._index_fd = os.open(seg.index_path, os.O_WRONLY | os.O_APPEND)
+
+    def _close_active(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.fsync(self._index_fd)
+            os.close(self._fd)
+            os.close(self._index_fd)
+            self._fd = self._index_fd = None
+
+    def append(self, jpeg_data, ts=None, key=None):
+        """Store one frame unless its content is already archived; returns its key (hex)"""
+        key = key or frame_key(jpeg_data)
+        with self._lock:
+            if key in self._keys:
+                self.stats['deduplicated'] += 1
+                return key.hex()
+            length = len(jpeg_data)
+            if self.active.size and self.active.size + RECORD.size + length > self.segment_bytes:
+                self._rotate()
+            ts = time.time() if ts is None else ts
+            offset = self.active.size + RECORD.size
+            # Header and JPEG in one write, without concatenating the frame
+            os.writev(self._fd, [RECORD.pack(MAGIC, length, ts, key), jpeg_data])
+            entry = (key, offset, length, ts)
+            os.write(self._index_fd, ENTRY.pack(*entry))
+            self.active.entries.append(entry)
+            self.active.size = offset + length
+            self._keys[key] = (self.active, offset, length)
+            self.stats['appended'] += 1
+            now = time.monotonic()
+            if now - self._last_sync >= self.sync_interval:
+                os.fsync(self._fd)
+                self._last_sync = now
+        return key.hex()
+
+    def _rotate(self):
+        self._close_active()
+        self._open_active(self._new_segment())
+        self._apply_retention()
+
+    def _apply_retention(self):
+        """Delete whole segments, oldest first, beyond the size or age limit"""
+        total = sum(seg.size for seg in self.segments)
+        cutoff = time.time() - self.max_age if self.max_age else None
+        while len(self.segments) > 1:
+            oldest = self.segments[0]
+            too_big = self.max_bytes and total > self.max_bytes
+            too_old = cutoff is not None and oldest.newest() < cutoff
+            if not (too_big or too_old):
+                break
+            for key, _, _, _ in oldest.entries:
+                if self._keys.get(key, (None,))[0] is oldest:
+                    del self._keys[key]
+            oldest.release()
+            os.remove(oldest.path)
+            os.remove(oldest.index_path)
+            total -= oldest.size
+            self.segments.pop(0)
+            self.stats['deleted_segments'] += 1
+
+    def get(self, key):
+        """Zero-copy memoryview of a frame (key as bytes or hex), or None if not archived"""
+        if isinstance(key, str):
+            key = bytes.fromhex(key)
+        with self._lock:
+            location = self._keys.get(key)
+            if location is None:
+                return None
+            seg, offset, length = location
+            return seg.view(offset, length)
+
+    def __contains__(self, key):
+        return (bytes.fromhex(key) if isinstance(key, str) else key) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def frames(self, since=None, until=None):
+        """(key hex, ts, memoryview) for every frame in write order"""
+        for seg in list(self.segments):
+            for key, offset, length, ts in list(seg.entries):
+                if (since is None or ts >= since) and (until is None or ts < until):
+                    yield key.hex(), ts, seg.view(offset, length)
+
+    def locations(self):
+        """(key hex, segment path, offset, length) per frame, for worker processes to map themselves"""
+        for seg in list(self.segments):
+            for key, offset, length, _ in list(seg.entries):
+                yield key.hex(), seg.path, offset, length
+
+    def disk_bytes(self):
+        return sum(seg.size + len(seg.entries) * ENTRY.size for seg in self.segments)
+
+    def close(self):
+        with self._lock:
+            self._close_active()
+            for seg in self.segments:
+                seg.release()
+
+def is_archive(path):
+    return os.path.isdir(path) and any(n.endswith(SEGMENT_SUFFIX) for n in os.listdir(path))
+
+_segment_maps = {}  # path -> read-only mmap, one per segment per process
+
+def read_frame_at(path, offset, length):
+    """Zero-copy view of one frame from a segment, without going through an archive
+
+    For worker processes: each segment is mapped once per process and kept,
+    and remapped only if the frame lies past the end of the mapping (the
+    segment was still being written when it was first mapped).
+    """
+    m = _segment_maps.get(path)
+    if m is None or offset + length > len(m):
+        with open(path, 'rb') as f:
+            m = _segment_maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(m)[offset:offset + length]
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value).timestamp() if value else None
+
+def export(directory, out_dir, since=None, until=None):
+    """Write frames back out as plain JPEGs named by capture time and key"""
+    archive = FrameArchive(directory, readonly=True)
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for key, ts, view in archive.frames(parse_time(since), parse_time(until)):
+        stamp = datetime.datetime.fromtimestamp(ts).strftime('%Y%m%d_%H%M%S_%f')
+        with open(os.path.join(out_dir, f"{stamp}_{key[:12]}.jpg"), 'wb') as f:
+            f.write(view)
+        count += 1
+    archive.close()
+    print(f"✓ Exported {count} frames to {out_dir}/")
+
+def print_stats(directory):
+    archive = FrameArchive(directory, readonly=True)
+    frames = sum(len(seg.entries) for seg in archive.segments)
+    print(f"{directory}: {len(archive.segments)} segments | {frames} frames | "
+          f"{archive.disk_bytes() / 1e6:.1f} MB")
+    for seg in archive.segments:
+        if seg.entries:
+            first = datetime.datetime.fromtimestamp(seg.entries[0][3])
+            last = datetime.datetime.fromtimestamp(seg.newest())
+            print(f"  {os.path.basename(seg.path)} | {len(seg.entries):6d} frames | "
+                  f"{seg.size / 1e6:7.1f} MB | {first:%Y-%m-%d %H:%M:%S} - {last:%H:%M:%S}")
+    archive.close()
+
+def bench(count):
+    """Loose files vs the archive: write, then read back and hash every frame"""
+    import cv2
+    import numpy as np
+
+    from sim_camera import load_frames
+
+    jpegs = [cv2.imencode('.jpg', img)[1].tobytes() for img in load_frames()]
+    frames = [jpegs[i % len(jpegs)] + struct.pack('<I', i) for i in range(count)]  # all distinct
+    root = tempfile.mkdtemp(prefix='archive_')
+    loose = os.path.join(root, 'loose')
+    os.makedirs(loose)
+
+    def run(label, fn):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        print(f"  {label:34s} {count / elapsed:8.0f} frames/s | {elapsed / count * 1e6:6.1f}us/frame")
+        return elapsed
+
+    print(f"{count} frames, {sum(map(len, frames)) / count / 1000:.1f}KB each, in {root}")
+
+    def write_loose(sync):
+        for i, jpeg in enumerate(frames):
+            with open(os.path.join(loose, f"tyre_{i}_{sync}.jpg"), 'wb') as f:
+                f.write(jpeg)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+    run("Loose files (open/write/close)", lambda: write_loose(False))
+    run("Loose files + fsync each", lambda: write_loose(True))
+
+    archive = FrameArchive(os.path.join(root, 'archive'), segment_bytes=16 * 1024 * 1024)
+    hashes = []
+    run("Content hash (BLAKE2b, done once)", lambda: hashes.extend(map(frame_key, frames)))
+    keys = []
+    run(f"Archive append (fsync every {SYNC_INTERVAL:g}s)",
+        lambda: keys.extend(archive.append(jpeg, key=h) for jpeg, h in zip(frames, hashes)))
+
+    def read_loose():
+        for i in range(count):
+            with open(os.path.join(loose, f"tyre_{i}_False.jpg"), 'rb') as f:
+                np.frombuffer(f.read(), np.uint8).sum()
+    run("Read loose files", read_loose)
+    run("Read archive (mmap, zero-copy)",
+        lambda: [np.frombuffer(archive.get(k), np.uint8).sum() for k in keys])
+    locations = [(path, offset, length) for _, path, offset, length in archive.locations()]
+    run("Read by location (worker maps)",
+        lambda: [np.frombuffer(read_frame_at(*loc), np.uint8).sum() for loc in locations])
+    print(f"  Archive: {len(archive.segments)} segments, {archive.disk_bytes() / 1e6:.1f} MB; "
+          f"loose: {count * 2} files")
+    archive.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Segmented frame archive tools")
+    sub = ap.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('stats', help="segments, frames and disk use")
+    p.add_argument('archive')
+    p = sub.add_parser('export', help="write frames back out as JPEG files")
+    p.add_argument('archive')
+    p.add_argument('out_dir')
+    p.add_argument('--since', help="ISO time, e.g. 2024-05-01T06:00")
+    p.add_argument('--until', help="ISO time")
+    p = sub.add_parser('bench', help="loose files vs archive")
+    p.add_argument('--count', type=int, default=2000)
+    args = ap.parse_args()
+
+    if args.command == 'stats':
+        print_stats(args.archive)
+    elif args.command == 'export':
+        export(args.archive, args.out_dir, args.since, args.until)
+    else:
+        bench(args.count)
+
+if __name__ == "__main__":
+    main()
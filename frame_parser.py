@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Streaming Frame Parser
+Incremental parser for the ESP32-CAM serial frame protocol:
+[START: FF AA 55 BB][4-byte length (little-endian)][JPEG data][END: FF BB 55 AA]
+
+Bytes can be fed in arbitrary chunks. The JPEG payload is written once into a
+bytearray sized from the length header and handed back as a memoryview, so
+nothing is re-copied as the frame grows.
+
+A frame is only accepted if its length is sane, its end marker matches and
+the payload is a complete JPEG (SOI at the start, EOI at the end). After a
+corrupt frame the bytes it swallowed are rescanned for the next start marker,
+so a frame that began inside a truncated one is still recovered. Every
+failure is counted in errors. Run directly for a microbenchmark, or with
+--corrupt for a recovery check on a damaged stream.
+"""
+
+import os
+import random
+import sys
+import time
+
+# Frame markers (must match firmware)
+FRAME_START = bytes([0xFF, 0xAA, 0x55, 0xBB])
+FRAME_END = bytes([0xFF, 0xBB, 0x55, 0xAA])
+
+# VGA JPEG at quality 15 is 40-60KB; a length beyond this is a corrupt header
+MAX_FRAME_LEN = int(os.environ.get("TYRE_CAM_MAX_FRAME_KB", 512)) * 1024
+
+# JPEG start/end of image markers; the encoder may pad a few bytes after EOI
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+EOI_SLACK = 16
+
+# Longest single blocking read while waiting on a frame (s)
+READ_SLICE = 0.05
+
+# Silence mid-frame after which the rest is taken as lost (s); the firmware
+# streams a frame without pauses
+STALL_TIMEOUT = 0.1
+
+# Parser states
+SYNC, LENGTH, PAYLOAD, TRAILER = range(4)
+
+class FrameParser:
+    """Incremental parser that resyncs on garbage between frames
+
+    Bytes outside frames (status lines, boot messages, noise) are counted in
+    skipped_bytes and, if on_skip is given, passed to it in stream order.
+    resyncs counts corrupt frames; errors breaks them down, plus partial
+    frames abandoned by reset() (truncated).
+    """
+
+    def __init__(self, max_frame_len=MAX_FRAME_LEN, on_skip=None):
+        self.max_frame_len = max_frame_len
+        self.on_skip = on_skip
+        self.frames = 0
+        self.resyncs = 0
+        self.skipped_bytes = 0
+        self.errors = {'bad_length': 0, 'bad_end': 0, 'bad_jpeg': 0, 'truncated': 0}
+        self._restart()
+
+    def reset(self):
+        """Drop any partial frame and go back to hunting for a start marker"""
+        if self._state != SYNC:
+            self.errors['truncated'] += 1
+        self._restart()
+
+    def summary(self):
+        return (f"frames {self.frames} | resyncs {self.resyncs} | "
+                + " | ".join(f"{k.replace('_', ' ')} {v}" for k, v in self.errors.items())
+                + f" | skipped {self.skipped_bytes}B")
+
+    def _restart(self):
+        self._state = SYNC
+        self._tail = b''  # up to 3 bytes that may begin a split start marker
+        self._small = bytearray()  # length / end marker bytes collected so far
+        self._view = None
+        self._pos = 0
+
+    def wanted(self):
+        """Bytes still needed to finish the current frame (0 while hunting)"""
+        if self._state == LENGTH:
+            return 4 - len(self._small)
+        if self._state == PAYLOAD:
+            return len(self._view) - self._pos + len(FRAME_END)
+        if self._state == TRAILER:
+            return len(FRAME_END) - len(self._small)
+        return 0
+
+    def feed(self, data):
+        """Consume a chunk of bytes, returning a list of completed payload views"""
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+        frames = []
+        i = 0
+        n = len(data)
+        while i < n:
+            if self._state == SYNC:
+                i = self._sync(data, i)
+            elif self._state == LENGTH:
+                take = min(4 - len(self._small), n - i)
+                self._small += data[i:i + take]
+                i += take
+                if len(self._small) == 4:
+                    frames += self._start_payload(int.from_bytes(self._small, 'little'))
+            elif self._state == PAYLOAD:
+                take = min(len(self._view) - self._pos, n - i)
+                self._view[self._pos:self._pos + take] = data[i:i + take]
+                self._pos += take
+                i += take
+                if self._pos == len(self._view):
+                    self._state = TRAILER
+            else:
+                take = min(len(FRAME_END) - len(self._small), n - i)
+                self._small += data[i:i + take]
+                i += take
+                if len(self._small) == len(FRAME_END):
+                    if self._small != FRAME_END:
+                        # The length was wrong or bytes were lost: the next frame
+                        # may start anywhere inside what this one swallowed
+                        frames += self._resync('bad_end', bytes(self._view) + self._small)
+                    elif not is_complete_jpeg(self._view):
+                        frames += self._resync('bad_jpeg', b'')
+                    else:
+                        frames.append(self._view)
+                        self.frames += 1
+                        self._restart()
+        return frames
+
+    def _resync(self, error, swallowed):
+        """Count a corrupt frame, then rescan the bytes it consumed after its start marker"""
+        self.errors[error] += 1
+        self.resyncs += 1
+        self._restart()
+        # Each rescan starts past an earlier start marker, so this terminates
+        return self.feed(swallowed) if swallowed else []
+
+    def _sync(self, data, i):
+        """Scan for a start marker, returning the index after it (or len(data))"""
+        n = len(data)
+        if self._tail:
+            probe = self._tail + data[i:i + len(FRAME_START) - 1]
+            idx = probe.find(FRAME_START)
+            if idx != -1:
+                # Marker straddles the previous chunk and this one
+                consumed = idx + len(FRAME_START) - len(self._tail)
+                self._skip(probe[:idx])
+                self._tail = b''
+                self._state = LENGTH
+                return i + consumed
+            if n - i < len(FRAME_START) - 1:
+                keep = len(probe) - _marker_prefix_len(probe)
+                self._skip(probe[:keep])
+                self._tail = probe[keep:]
+                return n
+            self._skip(self._tail)
+            self._tail = b''
+
+        idx = data.find(FRAME_START, i)
+        if idx != -1:
+            self._skip(data[i:idx])
+            self._state = LENGTH
+            return idx + len(FRAME_START)
+
+        # Hold back only a suffix that could begin a split start marker, so
+        # trailing text (e.g. a status line) is passed on without waiting
+        keep = max(i, n - _marker_prefix_len(data[max(i, n - 3):n]))
+        self._skip(data[i:keep])
+        self._tail = bytes(data[keep:n])
+        return n
+
+    def _skip(self, data):
+        if data:
+            self.skipped_bytes += len(data)
+            if self.on_skip:
+                self.on_skip(bytes(data))
+
+    def _start_payload(self, frame_len):
+        """Allocate the payload buffer once the length header is known"""
+        header = bytes(self._small)
+        self._small = bytearray()
+        if frame_len < len(JPEG_SOI) + len(JPEG_EOI) or frame_len > self.max_frame_len:
+            return self._resync('bad_length', header)
+        self._view = memoryview(bytearray(frame_len))
+        self._pos = 0
+        self._state = PAYLOAD
+        return []
+
+def is_complete_jpeg(data):
+    """SOI at the start and EOI within EOI_SLACK bytes of the end"""
+    if data[:2] != JPEG_SOI:
+        return False
+    return bytes(data[-EOI_SLACK:]).rfind(JPEG_EOI) != -1
+
+def _marker_prefix_len(data):
+    """Length of the longest suffix of data (up to 3 bytes) that starts FRAME_START"""
+    for k in range(min(len(FRAME_START) - 1, len(data)), 0, -1):
+        if data[len(data) - k:] == FRAME_START[:k]:
+            return k
+    return 0
+
+def read_frame(ser, parser, timeout, fail_fast=False):
+    """Read from a serial port until the parser yields a frame or timeout expires
+
+    While a frame is in flight the remaining byte count is requested in one
+    blocking read, so there is no polling sleep. The port timeout is shortened
+    for the duration so a stalled link cannot overrun the deadline. With
+    fail_fast, give up as soon as a frame is rejected as corrupt and no other
+    frame is in flight, or a frame stalls for STALL_TIMEOUT, so the caller can
+    retry instead of waiting out the timeout for a frame that will never come.
+    """
+    deadline = time.monotonic() + timeout
+    resyncs = parser.resyncs
+    last_byte = time.monotonic()
+    saved_timeout = ser.timeout
+    if saved_timeout is None or saved_timeout > READ_SLICE:
+        ser.timeout = READ_SLICE
+    try:
+        while time.monotonic() < deadline:
+            chunk = ser.read(parser.wanted() or max(1, ser.in_waiting))
+            if not chunk:
+                if fail_fast and parser.wanted() and time.monotonic() - last_byte > STALL_TIMEOUT:
+                    parser.reset()  # counted as truncated
+                    return None
+            else:
+                last_byte = time.monotonic()
+                frames = parser.feed(chunk)
+                if frames:
+                    return frames[0]
+                if fail_fast and parser.resyncs > resyncs and not parser.wanted():
+                    return None
+        return None
+    finally:
+        ser.timeout = saved_timeout
+
+def frame_ts_ms(text):
+    """The last FRAME_TS:<us> status line in text as ms, or None if missing or damaged"""
+    idx = text.rfind(b'FRAME_TS:')
+    if idx == -1:
+        return None
+    line = text[idx + 9:].split(b'\n', 1)[0]
+    try:
+        return int(line) / 1000
+    except ValueError:
+        return None  # resync garbage on a noisy link
+
+def encode_frame(jpeg_data):
+    """Wrap a JPEG payload in the firmware frame markers"""
+    return FRAME_START + len(jpeg_data).to_bytes(4, 'little') + bytes(jpeg_data) + FRAME_END
+
+def legacy_parse(chunks):
+    """The original `buffer += ser.read(...)` loop, for comparison"""
+    frames = []
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        while True:
+            start_idx = buffer.find(FRAME_START)
+            if start_idx == -1:
+                buffer = buffer[-3:]
+                break
+            buffer = buffer[start_idx:]
+            if len(buffer) < 8:
+                break
+            frame_len = int.from_bytes(buffer[4:8], 'little')
+            total_needed = 8 + frame_len + 4
+            if len(buffer) < total_needed:
+                break
+            frames.append(buffer[8:8 + frame_len])
+            buffer = buffer[total_needed:]
+    return frames
+
+def synthetic_stream(num_frames, rng):
+    """Build a byte stream of JPEG-sized frames with status lines and noise between them"""
+    stream = bytearray()
+    for i in range(num_frames):
+        payload = b'\xff\xd8' + rng.randbytes(rng.randint(40_000, 60_000)) + b'\xff\xd9'
+        stream += b'STATUS:OK\r\n' if i % 3 == 0 else rng.randbytes(rng.randint(0, 32))
+        stream += encode_frame(payload)
+    return bytes(stream)
+
+def damaged_stream(num_frames, rng):
+    """Frames with every kind of link damage; returns (stream, intact payloads)"""
+    stream = bytearray()
+    intact = []
+    for i in range(num_frames):
+        payload = b'\xff\xd8' + rng.randbytes(rng.randint(40_000, 60_000)) + b'\xff\xd9'
+        frame = bytearray(encode_frame(payload))
+        damage = i % 5
+        if damage == 1:  # cut short, the next frame starts inside its payload
+            frame = frame[:rng.randrange(8, len(frame) - 4)]
+        elif damage == 2:  # bit flip in the length header
+            frame[4 + rng.randrange(4)] ^= 1 << rng.randrange(8)
+        elif damage == 3:  # payload byte lost
+            del frame[rng.randrange(8, len(frame) - 4)]
+        elif damage == 4:  # SOI hit by noise, framing intact
+            frame[8] ^= 0x55
+        else:
+            intact.append(payload)
+        stream += b'STATUS:OK\r\n' + frame
+    return bytes(stream), intact
+
+def recovery_check(rng):
+    stream, intact = damaged_stream(100, rng)
+    print(f"Damaged stream: 100 frames, {len(intact)} intact, {len(stream)} bytes")
+    print("=" * 60)
+    for max_chunk in (64, 4096):
+        parser = FrameParser()
+        frames = []
+        for chunk in chop(stream, rng, max_chunk):
+            frames += parser.feed(chunk)
+        recovered = sum(1 for f in frames if f in intact)
+        print(f"  chunks <= {max_chunk:4d}B: recovered {recovered}/{len(intact)} | "
+              f"corrupt accepted {len(frames) - recovered} | {parser.summary()}")
+
+def chop(stream, rng, max_chunk):
+    """Split a stream at random boundaries, like successive serial reads"""
+    chunks = []
+    i = 0
+    while i < len(stream):
+        step = rng.randint(1, max_chunk)
+        chunks.append(stream[i:i + step])
+        i += step
+    return chunks
+
+def main():
+    rng = random.Random(42)
+    if sys.argv[1:] == ['--corrupt']:
+        recovery_check(rng)
+        return
+
+    # Optional: raw bytes recorded from a real serial port
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            stream = f.read()
+        print(f"Loaded {len(stream)} recorded bytes from {sys.argv[1]}")
+    else:
+        stream = synthetic_stream(60, rng)
+        print(f"Synthetic stream: 60 frames, {len(stream)} bytes")
+
+    print("=" * 60)
+    for max_chunk in (64, 512, 4096):
+        chunks = chop(stream, rng, max_chunk)
+
+        t0 = time.perf_counter()
+        parser = FrameParser()
+        frames = []
+        for chunk in chunks:
+            frames += parser.feed(chunk)
+        t_new = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        legacy = legacy_parse(chunks)
+        t_old = time.perf_counter() - t0
+
+        match = len(frames) == len(legacy) and all(a == b for a, b in zip(frames, legacy))
+        mb = len(stream) / 1e6
+        print(f"  chunks <= {max_chunk:4d}B: parser {mb / t_new:8.1f} MB/s | "
+              f"legacy {mb / t_old:8.1f} MB/s | "
+              f"frames {len(frames)} | resyncs {parser.resyncs} | "
+              f"{'match' if match else 'MISMATCH'}")
+
+if __name__ == "__main__":
+    main()
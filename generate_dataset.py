@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Labelled Dataset Generator
+Procedurally generates single-tyre capture frames with domain randomisation
+(dot shape, size, paint shade, motion blur, JPEG quality, lighting, noise)
+across a process pool, and writes them with a manifest:
+
+    python3 generate_dataset.py --out dataset --count 20000
+    python3 generate_dataset.py --evaluate dataset
+
+Every sample is reproducible from (seed, index). --evaluate runs the
+detector over a generated dataset and reports accuracy per dot type.
+"""
+
+import argparse
+import concurrent.futures as cf
+import csv
+import os
+import random
+import time
+
+import cv2
+import numpy as np
+
+import generate_test_video as gtv
+
+DOT_TYPES = ['circle', 'pacman', 'irregular', 'donut', 'double', 'smear', 'none']
+GOOD_DOTS = {'circle', 'donut'}  # matches the 'defective' flags in TYRES
+
+# Randomisation ranges
+RADIUS_RANGE = (8, 18)  # px; DOT_RADIUS is 12
+DOT_OFFSET_X, DOT_OFFSET_Y = 60, 40  # dot position on the sidewall, as in draw_tyre
+TYRE_X_JITTER = 2 * gtv.BELT_SPEED_PX_PER_FRAME  # trigger timing error
+BLUR_RANGE = (0, 12)  # px of belt travel during exposure
+JPEG_QUALITY_RANGE = (40, 95)
+GAIN_RANGE = (0.7, 1.3)
+OFFSET_RANGE = (-20, 20)
+GRADIENT_RANGE = (0.0, 0.25)  # ring light falloff across the frame
+NOISE_SIGMA_RANGE = (0.0, 8.0)
+
+# Paint shades as OpenCV HSV ranges (hue 0-179)
+SHADES = {
+    'yellow': ((20, 32), (170, 255), (180, 255)),
+    'red': ((-6, 6), (170, 255), (170, 255)),  # hue wraps around 0
+}
+
+MANIFEST_FIELDS = ['file', 'index', 'dot_type', 'expected', 'colour', 'radius', 'dot_x', 'dot_y',
+                   'blur_px', 'jpeg_quality', 'gain', 'offset', 'gradient', 'noise_sigma']
+
+def sample_params(index, seed):
+    """Draw every random choice for one sample from its own RNG"""
+    rng = random.Random(seed * 1_000_003 + index)
+    dot_type = rng.choice(DOT_TYPES)
+    colour = rng.choice(sorted(SHADES))
+    tyre_x = gtv.WIDTH // 2 + rng.randint(-TYRE_X_JITTER, TYRE_X_JITTER)
+    return {
+        'index': index,
+        'dot_type': dot_type,
+        'expected': 'ACCEPT' if dot_type in GOOD_DOTS else 'REJECT',
+        'colour': colour,
+        'hsv': tuple(rng.randint(lo, hi) for lo, hi in SHADES[colour]),
+        'radius': rng.randint(*RADIUS_RANGE),
+        'tyre_x': tyre_x,
+        'dot_x': tyre_x + rng.randint(-DOT_OFFSET_X, DOT_OFFSET_X),
+        'dot_y': gtv.HEIGHT // 2 + rng.randint(-DOT_OFFSET_Y, DOT_OFFSET_Y),
+        'blur_px': rng.randint(*BLUR_RANGE),
+        'jpeg_quality': rng.randint(*JPEG_QUALITY_RANGE),
+        'gain': round(rng.uniform(*GAIN_RANGE), 3),
+        'offset': rng.randint(*OFFSET_RANGE),
+        'gradient': round(rng.uniform(*GRADIENT_RANGE), 3),
+        'noise_sigma': round(rng.uniform(*NOISE_SIGMA_RANGE), 2),
+        'noise_seed': rng.getrandbits(31),
+    }
+
+def hsv_to_bgr(h, s, v):
+    pixel = np.uint8([[[h % 180, s, v]]])
+    return tuple(int(c) for c in cv2.cvtColor(pixel, cv2.COLOR_HSV2BGR)[0, 0])
+
+def render_sample(p, background):
+    """Render one randomised capture frame as BGR"""
+    frame = background.copy()
+    gtv.draw_tyre_body(frame, p['tyre_x'], gtv.HEIGHT // 2)
+    gtv.draw_dot(frame, p['dot_x'], p['dot_y'], p['dot_type'], hsv_to_bgr(*p['hsv']), p['radius'])
+    frame = gtv.apply_motion_blur(frame, p['blur_px'])
+
+    # Lighting: global gain/offset plus a horizontal ring-light falloff
+    ramp = np.linspace(1 - p['gradient'], 1 + p['gradient'], gtv.WIDTH, dtype=np.float32)
+    lit = frame.astype(np.float32)
+    lit *= (p['gain'] * ramp)[None, :, None]
+    lit += p['offset']
+    if p['noise_sigma']:
+        # cv2.randn is ~4x faster than numpy's normal; seeded per sample for reproducibility
+        noise = np.empty_like(lit)
+        cv2.setRNGSeed(p['noise_seed'])
+        cv2.randn(noise, 0, p['noise_sigma'])
+        lit += noise
+    return cv2.convertScaleAbs(lit)  # rounds and saturates to uint8
+
+def render_chunk(out_dir, indices, seed):
+    """Worker: render and write a run of samples, returning their manifest rows"""
+    cv2.setNumThreads(1)
+    background = gtv.belt_background()
+    rows = []
+    for index in indices:
+        p = sample_params(index, seed)
+        name = os.path.join('images', f"{index:07d}_{p['dot_type']}.jpg")
+        img = render_sample(p, background)
+        cv2.imwrite(os.path.join(out_dir, name), img, [cv2.IMWRITE_JPEG_QUALITY, p['jpeg_quality']])
+        p['file'] = name
+        rows.append({k: p[k] for k in MANIFEST_FIELDS})
+    return rows
+
+def generate_dataset(out_dir, count, workers, seed, chunk_size=256):
+    os.makedirs(os.path.join(out_dir, 'images'), exist_ok=True)
+    start = time.monotonic()
+    done = 0
+    with open(os.path.join(out_dir, 'manifest.csv'), 'w', newline='') as f, \
+            cf.ProcessPoolExecutor(workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        chunks = [range(i, min(i + chunk_size, count)) for i in range(0, count, chunk_size)]
+        futures = [pool.submit(render_chunk, out_dir, chunk, seed) for chunk in chunks]
+        for fut in futures:  # in submission order, so the manifest is sorted by index
+            rows = fut.result()
+            writer.writerows(rows)
+            done += len(rows)
+            if done % (chunk_size * 20) == 0:
+                print(f"  {done}/{count} | {done / (time.monotonic() - start):.0f} frames/s")
+    elapsed = time.monotonic() - start
+    print(f"\n✓ {count} frames in {elapsed:.1f}s ({count / elapsed:.0f} frames/s) -> {out_dir}/")
+
+def evaluate(out_dir, workers):
+    """Run the detector over a generated dataset and report accuracy and speed"""
+    from batch_reanalyze import analyze_chunk, chunked, init_worker
+
+    with open(os.path.join(out_dir, 'manifest.csv'), newline='') as f:
+        manifest = list(csv.DictReader(f))
+    items = [(m['file'], os.path.join(out_dir, m['file'])) for m in manifest]
+
+    start = time.monotonic()
+    results = {}
+    with cf.ProcessPoolExecutor(workers, initializer=init_worker,
+                                initargs=(None, None, False)) as pool:
+        for rows in pool.map(analyze_chunk, chunked(items, 128)):
+            for r in rows:
+                results[r['file']] = r
+    elapsed = time.monotonic() - start
+
+    per_type = {}
+    for m in manifest:
+        verdict = results[m['file']]['verdict'] or 'ERROR'
+        # No dot found counts as a reject, as in analyze_frame
+        got = 'ACCEPT' if verdict == 'ACCEPT' else 'REJECT'
+        ok, total = per_type.get(m['dot_type'], (0, 0))
+        per_type[m['dot_type']] = (ok + (got == m['expected']), total + 1)
+
+    correct = sum(ok for ok, _ in per_type.values())
+    print(f"Accuracy: {correct}/{len(manifest)} = {correct / len(manifest) * 100:.1f}% "
+          f"({len(manifest) / elapsed:.0f} images/s with {workers} workers)")
+    for dot_type in DOT_TYPES:
+        if dot_type in per_type:
+            ok, total = per_type[dot_type]
+            print(f"  {dot_type:10s} {ok:6d}/{total:<6d} {ok / total * 100:5.1f}%")
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a labelled, domain-randomised tyre dataset")
+    ap.add_argument('--out', default='dataset', help="output directory")
+    ap.add_argument('--count', type=int, default=10000)
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--workers', type=int, default=os.cpu_count())
+    ap.add_argument('--evaluate', metavar='DIR', help="score the detector on an existing dataset")
+    args = ap.parse_args()
+
+    if args.evaluate:
+        evaluate(args.evaluate, args.workers)
+    else:
+        generate_dataset(args.out, args.count, args.workers, args.seed)
+
+if __name__ == "__main__":
+    main()
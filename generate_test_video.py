@@ -5,9 +5,11 @@ Simulates tyres with paint dots moving on a conveyor belt
 For testing motion blur and capture timing
 """
 
+import argparse
 import cv2
 import numpy as np
 import os
+import time
 
 # Video settings
 OUTPUT_PATH = "/Users/marlionmac/Projects/tyre-inspection/test_conveyor.mp4"
@@ -25,6 +27,11 @@ DOT_RADIUS = 12  # pixels (small dot ~1.5cm on large tyre)
 DOT_COLOR_YELLOW = (0, 230, 255)  # BGR - yellow
 DOT_COLOR_RED = (0, 0, 230)  # BGR - red
 
+# Camera exposure (firmware F/M/A commands) and OV2640 rolling shutter
+PX_PER_MM = BELT_SPEED_PX_PER_FRAME * FPS / 150  # the ~150mm/sec belt moves 180 px/sec
+EXPOSURE_MS = {'FAST': 5, 'MEDIUM': 15, 'AUTO': 30}  # AUTO: worst case of the 8-30ms AEC range
+READOUT_MS = 25  # time to read VGA rows top to bottom (estimate at 20MHz XCLK)
+
 # Dot position variation (not always centered)
 import random
 random.seed(42)  # Reproducible randomness
@@ -44,8 +51,8 @@ TYRES = [
     {'dot_type': 'smear', 'color': 'yellow', 'defective': True},
 ]
 
-def draw_tyre(frame, x_center, y_center, tyre_info, tyre_index):
-    """Draw a tyre section with paint dot at realistic position"""
+def draw_tyre_body(frame, x_center, y_center):
+    """Draw the tyre rubber, tread and rim without a paint dot"""
     
     # Draw tyre rubber (dark black - realistic rubber)
     cv2.ellipse(frame, (x_center, y_center), (TYRE_WIDTH_PX//2, 120), 
@@ -64,6 +71,11 @@ def draw_tyre(frame, x_center, y_center, tyre_info, tyre_index):
     # Rim area (dark center)
     cv2.ellipse(frame, (x_center, y_center), (TYRE_WIDTH_PX//2 - 80, 40), 
                 0, 0, 360, (20, 20, 20), -1)
+
+def draw_tyre(frame, x_center, y_center, tyre_info, tyre_index):
+    """Draw a tyre section with paint dot at realistic position"""
+    
+    draw_tyre_body(frame, x_center, y_center)
     
     # Draw paint dot based on type
     dot_type = tyre_info['dot_type']
@@ -78,23 +90,27 @@ def draw_tyre(frame, x_center, y_center, tyre_info, tyre_index):
     dot_x = x_center + dot_offset_x
     dot_y = y_center + dot_offset_y
     
+    return draw_dot(frame, dot_x, dot_y, dot_type, color)
+
+def draw_dot(frame, dot_x, dot_y, dot_type, color, radius=DOT_RADIUS):
+    """Draw one paint dot shape; circle and donut are good, the rest are defects"""
     if dot_type == 'circle':
         # Perfect circle - ACCEPT
-        cv2.circle(frame, (dot_x, dot_y), DOT_RADIUS, color, -1)
+        cv2.circle(frame, (dot_x, dot_y), radius, color, -1)
         
     elif dot_type == 'pacman':
         # Circle with bite mark - REJECT
-        cv2.circle(frame, (dot_x, dot_y), DOT_RADIUS, color, -1)
+        cv2.circle(frame, (dot_x, dot_y), radius, color, -1)
         # Cut out a triangle (pac-man mouth) - scaled to small dot
-        bite_size = DOT_RADIUS // 2
+        bite_size = radius // 2
         pts = np.array([[dot_x, dot_y], 
-                        [dot_x + DOT_RADIUS + 2, dot_y - bite_size],
-                        [dot_x + DOT_RADIUS + 2, dot_y + bite_size]], np.int32)
+                        [dot_x + radius + 2, dot_y - bite_size],
+                        [dot_x + radius + 2, dot_y + bite_size]], np.int32)
         cv2.fillPoly(frame, [pts], (25, 25, 25))
         
     elif dot_type == 'irregular':
         # Irregular blob - REJECT (scaled down)
-        scale = DOT_RADIUS / 25  # Scale factor
+        scale = radius / 25  # Scale factor
         pts = np.array([
             [dot_x + int(-15*scale), dot_y + int(-8*scale)],
             [dot_x + int(-3*scale), dot_y + int(-18*scale)],
@@ -107,18 +123,18 @@ def draw_tyre(frame, x_center, y_center, tyre_info, tyre_index):
         
     elif dot_type == 'donut':
         # Donut shape - ACCEPT (if clean)
-        cv2.circle(frame, (dot_x, dot_y), DOT_RADIUS, color, -1)
-        cv2.circle(frame, (dot_x, dot_y), DOT_RADIUS // 3, (25, 25, 25), -1)
+        cv2.circle(frame, (dot_x, dot_y), radius, color, -1)
+        cv2.circle(frame, (dot_x, dot_y), radius // 3, (25, 25, 25), -1)
         
     elif dot_type == 'double':
         # Two dots - REJECT (scaled spacing)
-        spacing = DOT_RADIUS + 5
-        cv2.circle(frame, (dot_x - spacing//2, dot_y), DOT_RADIUS - 3, color, -1)
-        cv2.circle(frame, (dot_x + spacing//2, dot_y), DOT_RADIUS - 3, color, -1)
+        spacing = radius + 5
+        cv2.circle(frame, (dot_x - spacing//2, dot_y), radius - 3, color, -1)
+        cv2.circle(frame, (dot_x + spacing//2, dot_y), radius - 3, color, -1)
         
     elif dot_type == 'smear':
         # Smeared/elongated - REJECT
-        cv2.ellipse(frame, (dot_x, dot_y), (DOT_RADIUS + 8, DOT_RADIUS - 4),
+        cv2.ellipse(frame, (dot_x, dot_y), (radius + 8, radius - 4),
                     25, 0, 360, color, -1)
         
     elif dot_type == 'none':
@@ -127,52 +143,165 @@ def draw_tyre(frame, x_center, y_center, tyre_info, tyre_index):
     
     return frame
 
-def generate_video():
-    """Generate the test conveyor video"""
+def apply_motion_blur(frame, length):
+    """Horizontal motion blur of the given length in pixels (belt travel during exposure)"""
+    if length <= 1:
+        return frame
+    taps = int(np.ceil(length))
+    kernel = np.ones((1, taps), np.float32)
+    kernel[0, -1] = length - (taps - 1)  # partial pixel of travel
+    return cv2.filter2D(frame, -1, kernel / length)
+
+def apply_exposure(frame, speed_px_per_sec, exposure_ms, readout_ms=READOUT_MS):
+    """Belt motion during one exposure: rolling-shutter skew, then motion blur
     
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(OUTPUT_PATH, fourcc, FPS, (WIDTH, HEIGHT))
+    The OV2640 reads rows top to bottom over readout_ms, so each row sees the
+    belt a little further along. The belt moves left, so rows below the middle
+    of the frame are shifted left and rows above it right.
+    """
+    if speed_px_per_sec <= 0:
+        return frame
+    h, w = frame.shape[:2]
+    skew = speed_px_per_sec * readout_ms / 1000 / h  # px per row
+    shear = np.float32([[1, skew, -skew * h / 2], [0, 1, 0]])
+    frame = cv2.warpAffine(frame, shear, (w, h), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                           borderMode=cv2.BORDER_REPLICATE)
+    return apply_motion_blur(frame, speed_px_per_sec * exposure_ms / 1000)
+
+def belt_background():
+    """Empty gray conveyor belt with its texture lines"""
+    frame = np.ones((HEIGHT, WIDTH, 3), dtype=np.uint8) * 80
+    for y in range(0, HEIGHT, 20):
+        cv2.line(frame, (0, y), (WIDTH, y), (70, 70, 70), 1)
+    return frame
+
+def tyre_start_positions():
+    """Initial x position of every tyre (all start off-screen right)"""
+    return [WIDTH + 100 + i * (TYRE_WIDTH_PX + TYRE_SPACING_PX) for i in range(len(TYRES))]
+
+def render_frame(frame_num, tyre_positions, trigger_frames=None):
+    """Render one conveyor frame, logging capture-zone crossings into trigger_frames"""
+    frame = belt_background()
     
-    total_frames = FPS * DURATION_SEC
+    # Draw each tyre
+    y_center = HEIGHT // 2
     
-    # Calculate initial positions for all tyres (start off-screen right)
-    tyre_positions = []
     for i, tyre in enumerate(TYRES):
-        x_start = WIDTH + 100 + i * (TYRE_WIDTH_PX + TYRE_SPACING_PX)
-        tyre_positions.append(x_start)
+        x_pos = tyre_positions[i] - (frame_num * BELT_SPEED_PX_PER_FRAME)
+        
+        # Only draw if visible
+        if -TYRE_WIDTH_PX < x_pos < WIDTH + TYRE_WIDTH_PX:
+            draw_tyre(frame, int(x_pos), y_center, tyre, i)
+            
+            # Log when tyre center crosses the capture zone (center of frame)
+            if trigger_frames is not None and abs(x_pos - WIDTH//2) < BELT_SPEED_PX_PER_FRAME:
+                trigger_frames.append({
+                    'frame': frame_num,
+                    'time_sec': frame_num / FPS,
+                    'tyre_index': i,
+                    'expected': 'ACCEPT' if not tyre['defective'] else 'REJECT',
+                    'dot_type': tyre['dot_type']
+                })
     
-    # Capture trigger timestamps (for later sync testing)
-    trigger_frames = []
+    # Add frame counter and timestamp
+    cv2.putText(frame, f"Frame: {frame_num} | Time: {frame_num/FPS:.2f}s", 
+                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 1)
     
-    print(f"Generating {total_frames} frames...")
+    # Add capture zone indicator (center line)
+    cv2.line(frame, (WIDTH//2, 0), (WIDTH//2, HEIGHT), (0, 255, 0), 1)
+    cv2.putText(frame, "CAPTURE ZONE", (WIDTH//2 - 60, HEIGHT - 20), 
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
     
-    for frame_num in range(total_frames):
-        # Create belt background (gray conveyor)
-        frame = np.ones((HEIGHT, WIDTH, 3), dtype=np.uint8) * 80
+    return frame
+
+class ConveyorRenderer:
+    """Pre-renders the belt and each tyre sprite once, then composes frames by slicing
+
+    The belt texture only varies by row, so a tyre drawn once over a strip of
+    belt can be pasted at any x with a plain slice copy. Tyres cut by the frame
+    edge are drawn directly unless exact=False, because OpenCV clips the 1px
+    tread outlines slightly differently; with exact=True output is
+    pixel-identical to render_frame(). With cycle=True the TYRES list repeats
+    forever (tyre k looks like TYRES[k % len]) for long soak-test runs.
+    exposure ('FAST', 'MEDIUM' or 'AUTO') adds the motion blur and rolling-shutter
+    skew of that firmware exposure mode at the belt speed.
+    """
+    
+    def __init__(self, tyres=TYRES, belt_speed=BELT_SPEED_PX_PER_FRAME, cycle=False, exact=True,
+                 exposure=None):
+        self.tyres = tyres
+        self.belt_speed = belt_speed
+        self.cycle = cycle
+        self.exact = exact
+        self.exposure = exposure
+        self.pitch = TYRE_WIDTH_PX + TYRE_SPACING_PX
         
-        # Add belt texture lines
-        for y in range(0, HEIGHT, 20):
-            cv2.line(frame, (0, y), (WIDTH, y), (70, 70, 70), 1)
+        self.background = belt_background()
         
-        # Draw each tyre
-        y_center = HEIGHT // 2
+        self.sprites = [self._render_sprite(tyre, i) for i, tyre in enumerate(tyres)]
+        self.frame = np.empty_like(self.background)  # reused output buffer
+    
+    def _render_sprite(self, tyre, index):
+        """Tyre drawn over a strip of belt, cropped to its columns: (dx, pixels)"""
+        cx = TYRE_WIDTH_PX
+        strip = np.repeat(self.background[:, :1], 2 * TYRE_WIDTH_PX, axis=1)
+        draw_tyre(strip, cx, HEIGHT // 2, tyre, index)
+        cols = np.flatnonzero((strip != self.background[:, :1]).any(axis=(0, 2)))
+        x0, x1 = cols[0], cols[-1] + 1
+        return x0 - cx, strip[:, x0:x1].copy()
+    
+    def tyre_x(self, k, frame_num):
+        """Centre x of tyre k (float, like render_frame)"""
+        return WIDTH + 100 + k * self.pitch - frame_num * self.belt_speed
+    
+    def visible_tyres(self, frame_num):
+        """Indices of tyres on screen, found arithmetically instead of scanning the list"""
+        # Visible while -TYRE_WIDTH_PX < x < WIDTH + TYRE_WIDTH_PX
+        base = WIDTH + 100 - frame_num * self.belt_speed
+        first = max(0, int(np.floor((-TYRE_WIDTH_PX - base) / self.pitch)))
+        last = int(np.ceil((WIDTH + TYRE_WIDTH_PX - base) / self.pitch))
+        if not self.cycle:
+            last = min(last, len(self.tyres) - 1)
+        return [k for k in range(first, last + 1)
+                if -TYRE_WIDTH_PX < self.tyre_x(k, frame_num) < WIDTH + TYRE_WIDTH_PX]
+    
+    def tyre_info(self, k):
+        return self.tyres[k % len(self.tyres)]
+    
+    def render(self, frame_num, trigger_frames=None):
+        """Compose one frame into the reused buffer (copy it if you need to keep it)"""
+        frame = self.frame
+        np.copyto(frame, self.background)
         
-        for i, tyre in enumerate(TYRES):
-            x_pos = tyre_positions[i] - (frame_num * BELT_SPEED_PX_PER_FRAME)
+        for k in self.visible_tyres(frame_num):
+            x_pos = self.tyre_x(k, frame_num)
+            dx, pixels = self.sprites[k % len(self.sprites)]
+            left = int(x_pos) + dx
+            right = left + pixels.shape[1]
             
-            # Only draw if visible
-            if -TYRE_WIDTH_PX < x_pos < WIDTH + TYRE_WIDTH_PX:
-                draw_tyre(frame, int(x_pos), y_center, tyre, i)
-                
-                # Log when tyre center crosses the capture zone (center of frame)
-                if abs(x_pos - WIDTH//2) < BELT_SPEED_PX_PER_FRAME:
-                    trigger_frames.append({
-                        'frame': frame_num,
-                        'time_sec': frame_num / FPS,
-                        'tyre_index': i,
-                        'expected': 'ACCEPT' if not tyre['defective'] else 'REJECT',
-                        'dot_type': tyre['dot_type']
-                    })
+            if 0 <= left and right <= WIDTH:
+                frame[:, left:right] = pixels
+            elif self.exact:
+                draw_tyre(frame, int(x_pos), HEIGHT // 2, self.tyre_info(k), k % len(self.tyres))
+            else:
+                # Clip the translated sprite against the frame edges
+                dst0, dst1 = max(0, left), min(WIDTH, right)
+                if dst1 > dst0:
+                    frame[:, dst0:dst1] = pixels[:, dst0 - left:dst1 - left]
+            
+            # Log when tyre center crosses the capture zone (center of frame)
+            if trigger_frames is not None and abs(x_pos - WIDTH//2) < self.belt_speed:
+                tyre = self.tyre_info(k)
+                trigger_frames.append({
+                    'frame': frame_num,
+                    'time_sec': frame_num / FPS,
+                    'tyre_index': k,
+                    'expected': 'ACCEPT' if not tyre['defective'] else 'REJECT',
+                    'dot_type': tyre['dot_type']
+                })
+        
+        if self.exposure:
+            np.copyto(frame, apply_exposure(frame, self.belt_speed * FPS, EXPOSURE_MS[self.exposure]))
         
         # Add frame counter and timestamp
         cv2.putText(frame, f"Frame: {frame_num} | Time: {frame_num/FPS:.2f}s", 
@@ -182,7 +311,26 @@ def generate_video():
         cv2.line(frame, (WIDTH//2, 0), (WIDTH//2, HEIGHT), (0, 255, 0), 1)
         cv2.putText(frame, "CAPTURE ZONE", (WIDTH//2 - 60, HEIGHT - 20), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-        
+        return frame
+
+def generate_video():
+    """Generate the test conveyor video"""
+    
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(OUTPUT_PATH, fourcc, FPS, (WIDTH, HEIGHT))
+    
+    total_frames = FPS * DURATION_SEC
+    
+    # Belt and tyre sprites are drawn once up front
+    renderer = ConveyorRenderer()
+    
+    # Capture trigger timestamps (for later sync testing)
+    trigger_frames = []
+    
+    print(f"Generating {total_frames} frames...")
+    
+    for frame_num in range(total_frames):
+        frame = renderer.render(frame_num, trigger_frames)
         out.write(frame)
         
         if frame_num % 30 == 0:
@@ -207,7 +355,84 @@ def generate_video():
     
     return trigger_frames
 
+def belt_speed_for(tyres_per_min):
+    """Belt speed (px/frame) that passes the given number of tyres per minute"""
+    return (TYRE_WIDTH_PX + TYRE_SPACING_PX) * tyres_per_min / 60 / FPS
+
+def generate_bulk(minutes, tyres_per_min, video_path=None, frames_dir=None, exposure=None):
+    """Render a long conveyor run as a video and/or labelled JPEGs of the trigger frames"""
+    renderer = ConveyorRenderer(belt_speed=belt_speed_for(tyres_per_min), cycle=True, exact=False,
+                                exposure=exposure)
+    total_frames = int(minutes * 60 * FPS)
+    
+    out = None
+    if video_path:
+        out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), FPS, (WIDTH, HEIGHT))
+    labels = None
+    if frames_dir:
+        os.makedirs(frames_dir, exist_ok=True)
+        labels = open(os.path.join(frames_dir, "labels.csv"), "w")
+        labels.write("file,frame,time_sec,tyre_index,dot_type,expected\n")
+    
+    print(f"Rendering {minutes} min at {tyres_per_min} tyres/min "
+          f"({renderer.belt_speed:.2f} px/frame, {total_frames} frames, "
+          f"exposure {exposure or 'none'})...")
+    start = time.monotonic()
+    triggers = 0
+    for frame_num in range(total_frames):
+        trigger_frames = []
+        frame = renderer.render(frame_num, trigger_frames)
+        if out:
+            out.write(frame)
+        if labels:
+            for t in trigger_frames:
+                name = f"frame_{frame_num:07d}_tyre_{t['tyre_index']}.jpg"
+                cv2.imwrite(os.path.join(frames_dir, name), frame)
+                labels.write(f"{name},{frame_num},{t['time_sec']:.3f},{t['tyre_index']},"
+                             f"{t['dot_type']},{t['expected']}\n")
+        triggers += len(trigger_frames)
+        
+        if frame_num % (FPS * 60) == 0 and frame_num:
+            print(f"  {frame_num // (FPS * 60)} min | {frame_num / (time.monotonic() - start):.0f} fps")
+    
+    if out:
+        out.release()
+    if labels:
+        labels.close()
+    elapsed = time.monotonic() - start
+    print(f"\n✓ {total_frames} frames, {triggers} trigger frames in {elapsed:.1f}s "
+          f"({total_frames / elapsed:.0f} fps)")
+
+def verify_renderer():
+    """Check ConveyorRenderer against the reference render_frame for the 10-tyre video"""
+    renderer = ConveyorRenderer()
+    positions = tyre_start_positions()
+    mismatches = 0
+    for frame_num in range(FPS * DURATION_SEC):
+        if not np.array_equal(render_frame(frame_num, positions), renderer.render(frame_num)):
+            mismatches += 1
+    print(f"{'✓' if mismatches == 0 else '✗'} {mismatches} mismatched frames "
+          f"out of {FPS * DURATION_SEC}")
+    return mismatches == 0
+
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Synthetic tyre conveyor video generator")
+    ap.add_argument('--bulk-video', help="write a long cycled conveyor video to this path")
+    ap.add_argument('--bulk-frames', help="write labelled trigger-frame JPEGs to this directory")
+    ap.add_argument('--minutes', type=float, default=60, help="bulk run length")
+    ap.add_argument('--tyres-per-min', type=float, default=60, help="bulk belt throughput")
+    ap.add_argument('--exposure', choices=sorted(EXPOSURE_MS),
+                    help="simulate the blur and skew of a firmware exposure mode")
+    ap.add_argument('--verify', action='store_true', help="check the sprite renderer is pixel-identical")
+    args = ap.parse_args()
+    
+    if args.verify:
+        raise SystemExit(0 if verify_renderer() else 1)
+    if args.bulk_video or args.bulk_frames:
+        generate_bulk(args.minutes, args.tyres_per_min, args.bulk_video, args.bulk_frames,
+                      args.exposure)
+        raise SystemExit(0)
+    
     triggers = generate_video()
     print(f"\n✓ Trigger timestamps saved to: trigger_timestamps.txt")
     print(f"\nNext: Play this video and point ESP32-CAM at screen to test capture timing!")
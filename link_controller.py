@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Adaptive Link Controller
+Chooses per tyre between two capture strategies, using the firmware's runtime
+resolution commands (R = QVGA, V = VGA):
+
+    QVGA_FIRST  capture at QVGA (~1/3 the bytes); recapture at VGA only when
+                the dot is borderline (solidity within SOLIDITY_BAND of the
+                threshold, small or missing) and the tyre is still in view
+    VGA         always capture at VGA
+
+Transfer time per resolution, resolution switch time and the borderline
+rate are tracked as moving averages; after every tyre the strategy with
+the lower expected serial time per tyre is chosen, and every choice,
+recapture and budget overrun is logged. Run directly to compare fixed and
+adaptive strategies on the simulated camera.
+"""
+
+import csv
+import time
+
+import cv2
+import numpy as np
+
+from sync_capture_test import (CONFIDENT_DOT_AREA, SOLIDITY_BAND, analyze_frame,
+                               analyze_scaled, is_borderline)
+
+QVGA_FIRST, VGA = 'QVGA_FIRST', 'VGA'
+ALPHA = 0.2  # moving-average weight of the newest timing sample
+RATE_ALPHA = 0.05  # borderline rate needs a longer memory: defects come in runs
+HYSTERESIS = 0.05  # switch strategy only when the other is this much cheaper
+PROBE_EVERY = 20  # tyres between QVGA probes while in VGA mode, to refresh the estimates
+RECAPTURE_WINDOW = 0.6  # s after the trigger the dot is still inside the capture zone
+FULL_WIDTH = 640
+NOMINAL_VGA_TRANSFER = 0.25  # s at 921600 baud, until a VGA or QVGA transfer has been timed
+
+def ewma(old, sample, alpha=ALPHA):
+    return sample if old is None else old + alpha * (sample - old)
+
+class LinkController:
+    """Wraps a CameraCapture; capture_and_analyze() returns an analyze_frame result"""
+
+    def __init__(self, camera, tyre_interval=None, band=SOLIDITY_BAND,
+                 confident_area=CONFIDENT_DOT_AREA, recapture_window=RECAPTURE_WINDOW,
+                 mode=QVGA_FIRST, adaptive=True):
+        self.camera = camera
+        self.tyre_interval = tyre_interval  # s between tyres at the current belt speed
+        self.band = band
+        self.confident_area = confident_area
+        self.recapture_window = recapture_window
+        self.mode = mode
+        self.adaptive = adaptive
+        self.resolution = None  # unknown until the first switch
+        self.transfer = {'QVGA': None, 'VGA': None}  # s per capture
+        self.frame_bytes = {'QVGA': None, 'VGA': None}
+        self.switch_time = None
+        self.failed_switches = 0
+        self.borderline_rate = None
+        self.tyres = 0
+        self.serial_time = 0.0  # capture + switch time spent, for the average per tyre
+        self.log = []
+
+    def set_belt_speed(self, tyres_per_min):
+        self.tyre_interval = 60 / tyres_per_min
+
+    def capture_and_analyze(self, expected=None):
+        trigger = time.monotonic()
+        self.tyres += 1
+        probe = self.mode == VGA and self.adaptive and self.tyres % PROBE_EVERY == 0
+        first = 'QVGA' if self.mode == QVGA_FIRST or probe else 'VGA'
+
+        jpeg_data, img = self._capture(first)
+        if img is None:
+            result = {'error': 'capture_failed', 'correct': False}
+        elif first == 'VGA':
+            result = analyze_frame(jpeg_data, expected)
+        else:
+            result = analyze_scaled(img, expected, FULL_WIDTH // img.shape[1])
+            borderline = is_borderline(result, self.band, self.confident_area)
+            self.borderline_rate = ewma(self.borderline_rate, float(borderline), RATE_ALPHA)
+            if borderline:
+                result = self._recapture(result, expected, trigger)
+        result['resolution'] = self.resolution
+
+        if self.adaptive:
+            self._choose_mode()
+        return result
+
+    def _recapture(self, result, expected, trigger):
+        est = (self.switch_time or 0) + self._vga_transfer()
+        elapsed = time.monotonic() - trigger
+        if elapsed + est > self.recapture_window:
+            self._decide('keep_qvga', f"{self._why(result)} but recapture would end "
+                         f"{(elapsed + est) * 1000:.0f}ms after the trigger")
+            return result
+        self._decide('recapture_vga', self._why(result))
+        jpeg_data, img = self._capture('VGA')
+        if img is None:
+            return result
+        return analyze_frame(jpeg_data, expected)
+
+    def _vga_transfer(self):
+        if self.transfer['VGA'] is not None:
+            return self.transfer['VGA']
+        if self.transfer['QVGA'] is not None:
+            return self.transfer['QVGA'] * 3
+        return NOMINAL_VGA_TRANSFER
+
+    def _why(self, result):
+        if not result.get('dot_found'):
+            return "no dot at QVGA"
+        if result['area'] < self.confident_area:
+            return f"small dot ({result['area']}px)"
+        return f"solidity {result['solidity']} near the threshold"
+
+    def _capture(self, resolution):
+        if self.resolution != resolution:
+            t0 = time.monotonic()
+            if self.camera.set_resolution(resolution):
+                self.resolution = resolution
+            else:
+                self.failed_switches += 1
+            # A failed attempt still costs its time; the frame below is in the old mode
+            self.switch_time = ewma(self.switch_time, time.monotonic() - t0)
+            self.serial_time += time.monotonic() - t0
+        t0 = time.monotonic()
+        jpeg_data = self.camera.capture()
+        elapsed = time.monotonic() - t0
+        self.serial_time += elapsed
+        if jpeg_data is None:
+            return None, None
+        # Measured against the mode actually captured, which a failed switch left unchanged
+        if self.resolution is not None:
+            self.transfer[self.resolution] = ewma(self.transfer[self.resolution], elapsed)
+            self.frame_bytes[self.resolution] = ewma(self.frame_bytes[self.resolution], len(jpeg_data))
+        img = cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), cv2.IMREAD_COLOR)
+        return jpeg_data, img
+
+    def expected_cost(self):
+        """Expected serial time per tyre (s) of each strategy, or None while unmeasured"""
+        t_q, t_v = self.transfer['QVGA'], self.transfer['VGA']
+        costs = {QVGA_FIRST: None, VGA: t_v}
+        if t_q is not None and t_v is not None and self.borderline_rate is not None:
+            # A recapture switches to VGA and back again before the next tyre
+            costs[QVGA_FIRST] = t_q + self.borderline_rate * (t_v + 2 * (self.switch_time or 0))
+        return costs
+
+    def _choose_mode(self):
+        costs = self.expected_cost()
+        if None in costs.values():
+            return
+        best = min(costs, key=costs.get)
+        if best != self.mode and costs[best] < costs[self.mode] * (1 - HYSTERESIS):
+            self._decide(f'mode_{best.lower()}', f"expected {costs[best] * 1000:.0f}ms/tyre vs "
+                         f"{costs[self.mode] * 1000:.0f}ms ({self.mode}), "
+                         f"borderline rate {self.borderline_rate:.2f}")
+            self.mode = best
+        if self.tyre_interval and costs[self.mode] > self.tyre_interval:
+            self._decide('over_budget', f"{costs[self.mode] * 1000:.0f}ms/tyre exceeds the "
+                         f"{self.tyre_interval * 1000:.0f}ms between tyres")
+
+    def _decide(self, action, reason):
+        costs = self.expected_cost()
+        entry = {
+            'time': time.time(),
+            'tyre': self.tyres,
+            'action': action,
+            'reason': reason,
+            'mode': self.mode,
+            'qvga_first_ms': round(costs[QVGA_FIRST] * 1000, 1) if costs[QVGA_FIRST] else None,
+            'vga_ms': round(costs[VGA] * 1000, 1) if costs[VGA] else None,
+        }
+        self.log.append(entry)
+        print(f"  🔀 Tyre {self.tyres}: {action} - {reason}")
+
+    def write_log(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['time', 'tyre', 'action', 'reason', 'mode',
+                                                   'qvga_first_ms', 'vga_ms'])
+            writer.writeheader()
+            writer.writerows(self.log)
+
+    def report(self):
+        avg = self.serial_time / self.tyres * 1000 if self.tyres else 0
+        sizes = ' | '.join(f"{r} {b / 1024:.1f}KB in {self.transfer[r] * 1000:.0f}ms"
+                           for r, b in self.frame_bytes.items() if b)
+        print(f"Link: {self.tyres} tyres | {avg:.0f}ms serial time per tyre | mode {self.mode} | "
+              f"{sizes} | failed switches {self.failed_switches}")
+
+def main():
+    import detector_benchmark as db
+    import generate_test_video as gtv
+    from sim_camera import SimulatedCamera
+    from sync_capture_test import CameraCapture
+
+    # The sim serves these in order, so the expected verdicts line up with captures
+    positions = gtv.tyre_start_positions()
+    crossings = db.crossing_frames()
+    frames = [gtv.render_frame(f, positions) for f, _ in crossings]
+    labels = ['REJECT' if gtv.TYRES[i]['defective'] else 'ACCEPT' for _, i in crossings]
+    tyres = len(labels) * 3
+
+    strategies = [('VGA only', VGA, False), ('QVGA first', QVGA_FIRST, False),
+                  ('adaptive', QVGA_FIRST, True)]
+    for name, mode, adaptive in strategies:
+        with SimulatedCamera(frames) as sim:
+            sim.advance = False  # a recapture sees the same tyre, not the next one
+            camera = CameraCapture(sim.port, sim.baud)
+            link = LinkController(camera, mode=mode, adaptive=adaptive)
+            link.set_belt_speed(60)
+            print(f"\n{name}:")
+            correct = 0
+            for i in range(tyres):
+                sim.frame_index = i
+                result = link.capture_and_analyze(labels[i % len(labels)])
+                correct += bool(result.get('correct'))
+            camera.close()
+        link.report()
+        print(f"  Accuracy {correct}/{tyres} | "
+              f"{sum(1 for d in link.log if d['action'] == 'recapture_vga')} VGA recaptures")
+
+if __name__ == "__main__":
+    main()
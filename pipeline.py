@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Capture Pipeline
+Runs capture -> decode/analyze -> save as separate stages joined by bounded
+queues, so the serial link keeps transferring the next frame while earlier
+frames are being analyzed and written to disk:
+
+    serial reader (1 thread) -> analyze pool (N threads) -> writer (1 thread)
+
+OpenCV releases the GIL in imdecode/cvtColor/morphology, so the analyze pool
+scales on threads. With burst=K the reader grabs K frames per job and the
+analyze function receives the list of JPEGs. With a TyreTracker the reader
+follows tyres across frames and only each tyre's best-centred frame goes to
+the analyze pool; its other frames are reported as duplicates. With a
+ResultStore the writer queues each result and frame into the database;
+without one, an archive (FrameArchive) takes the frames directly. Run
+directly to compare against the serial loop using the simulated camera.
+"""
+
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import METRICS
+
+class StageStats:
+    """Latency samples and peak input queue depth for one stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, depth=0):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.max_depth = max(self.max_depth, depth)
+
+    def summary(self):
+        lat = sorted(self.latencies)
+        if not lat:
+            return f"{self.name:8s} | no samples"
+        p50 = lat[len(lat) // 2] * 1000
+        p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000
+        return (f"{self.name:8s} | n={len(lat):4d} | p50 {p50:7.1f}ms | "
+                f"p95 {p95:7.1f}ms | max {lat[-1] * 1000:7.1f}ms | "
+                f"max queue {self.max_depth}")
+
+class CapturePipeline:
+    """Staged capture engine; jobs are trigger dicts with 'expected' and 'filename'"""
+
+    def __init__(self, camera, analyze, workers=2, queue_size=4, on_result=None, burst=1,
+                 tracker=None, store=None, archive=None):
+        if tracker is not None and burst > 1:
+            raise ValueError("a tracker needs one frame per job")
+        self.camera = camera
+        self.analyze = analyze
+        self.workers = workers
+        self.burst = burst
+        self.tracker = tracker
+        self.store = store
+        self.archive = archive
+        self.on_result = on_result
+        self.results = []
+
+        # Bounded queues: a stalled stage applies back-pressure instead of buffering frames
+        self.trigger_q = queue.Queue(queue_size)
+        self.analyze_q = queue.Queue(queue_size)
+        self.write_q = queue.Queue(queue_size * 2)
+
+        self.stats = {name: StageStats(name)
+                      for name in ('capture', 'analyze', 'write', 'total')}
+        METRICS.gauge('trigger_queue_depth', self.trigger_q.qsize)
+        METRICS.gauge('analyze_queue_depth', self.analyze_q.qsize)
+        self._threads = []
+
+    def start(self):
+        self._spawn(self._reader)
+        for _ in range(self.workers):
+            self._spawn(self._analyzer)
+        self._spawn(self._writer)
+        return self
+
+    def _spawn(self, target):
+        t = threading.Thread(target=target, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def submit(self, job, block=True):
+        """Queue a capture; returns False if the pipeline is saturated and block is False"""
+        job['submitted'] = time.monotonic()
+        try:
+            self.trigger_q.put(job, block=block)
+        except queue.Full:
+            return False
+        return True
+
+    def close(self):
+        """Drain every stage and return the results in completion order"""
+        self.trigger_q.put(None)
+        for t in self._threads:
+            t.join()
+        return self.results
+
+    def report(self):
+        print("Pipeline stage latency:")
+        for s in self.stats.values():
+            print(f"  {s.summary()}")
+
+    def _reader(self):
+        """Owns the serial port: the only stage on the critical path"""
+        try:
+            while True:
+                job = self.trigger_q.get()
+                if job is None:
+                    break
+                t0 = time.monotonic()
+                try:
+                    jpeg_data = self._grab()
+                except Exception as e:
+                    # A failed capture is reported as one; the reader keeps serving triggers
+                    job['capture_error'] = f"capture_failed: {e}"
+                    jpeg_data = None
+                self.stats['capture'].record(time.monotonic() - t0, self.trigger_q.qsize())
+                # When the frame was taken: a trigger queued behind a transfer is
+                # captured well after its scheduled time
+                frame_time = getattr(self.camera, 'frame_time', None)
+                job['captured_at'] = t0 if frame_time is None else frame_time
+                if self.tracker is not None and jpeg_data is not None:
+                    try:
+                        self._track(job, jpeg_data)
+                    except Exception as e:
+                        print(f"⚠️ Tracker failed ({e}), analysing the frame on its own")
+                        self.analyze_q.put((job, jpeg_data))
+                else:
+                    self.analyze_q.put((job, jpeg_data))
+            if self.tracker is not None:
+                self._dispatch(self.tracker.flush())
+        finally:
+            # Always posted, so close() returns even if the reader died
+            for _ in range(self.workers):
+                self.analyze_q.put(None)
+
+    def _grab(self):
+        if self.burst > 1:
+            # Failed grabs are dropped; the burst only fails if every grab did
+            frames = [self.camera.capture() for _ in range(self.burst)]
+            return [f for f in frames if f is not None] or None
+        return self.camera.capture()
+
+    def _track(self, job, jpeg_data):
+        """Cheap 1/4-scale decode for the tracker; the frame is analysed when its tyre is due"""
+        small = cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), cv2.IMREAD_REDUCED_COLOR_4)
+        if small is None:
+            self.analyze_q.put((job, jpeg_data))  # analyze reports the decode failure
+            return
+        with METRICS.stage('track'):
+            ready = self.tracker.update(small, job['captured_at'], (job, jpeg_data))
+        self._dispatch(ready)
+
+    def _dispatch(self, ready):
+        for tyre_id, best, others in ready:
+            if best is not None:
+                job, jpeg_data = best
+                if tyre_id is not None:
+                    job['tyre_id'] = tyre_id
+                self.analyze_q.put((job, jpeg_data))
+            for job, jpeg_data in others:
+                job['tyre_id'] = tyre_id
+                METRICS.count('duplicate_frames')
+                self.write_q.put((job, jpeg_data, {'duplicate': True, 'tyre_id': tyre_id}))
+
+    def _analyzer(self):
+        try:
+            while True:
+                item = self.analyze_q.get()
+                if item is None:
+                    break
+                job, jpeg_data = item
+                depth = self.analyze_q.qsize()
+                t0 = time.monotonic()
+                if jpeg_data is None:
+                    result = {'error': job.get('capture_error', 'capture_failed'), 'correct': False}
+                else:
+                    try:
+                        result = self.analyze(jpeg_data, job.get('expected'))
+                    except Exception as e:
+                        result = {'error': f"analyze_failed: {e}", 'correct': False}
+                    if 'tyre_id' in job:
+                        result['tyre_id'] = job['tyre_id']
+                self.stats['analyze'].record(time.monotonic() - t0, depth)
+                self.write_q.put((job, jpeg_data, result))
+        finally:
+            self.write_q.put(None)
+
+    def _writer(self):
+        finished = 0
+        while finished < self.workers:
+            item = self.write_q.get()
+            if item is None:
+                finished += 1
+                continue
+            job, jpeg_data, result = item
+            depth = self.write_q.qsize()
+            t0 = time.monotonic()
+            try:
+                self._save(job, jpeg_data, result)
+            except Exception as e:
+                # The result still counts; only its frame or row is lost
+                print(f"⚠️ Saving result failed: {e}")
+                METRICS.count('save_errors')
+            result['trigger'] = job
+            self.results.append(result)
+            if self.on_result:
+                try:
+                    self.on_result(result)
+                except Exception as e:
+                    print(f"⚠️ Result callback failed: {e}")
+            now = time.monotonic()
+            self.stats['write'].record(now - t0, depth)
+            self.stats['total'].record(now - job['submitted'])
+
+    def _save(self, job, jpeg_data, result):
+        if jpeg_data is not None and job.get('filename'):
+            with METRICS.stage('save'):
+                save_jpeg(job['filename'], jpeg_data)
+        if self.store is not None and not result.get('duplicate'):
+            self.store.record(result, jpeg_data)
+        elif self.archive is not None and jpeg_data is not None:
+            with METRICS.stage('save'):
+                frames = jpeg_data if isinstance(jpeg_data, list) else [jpeg_data]
+                result['frame_keys'] = [self.archive.append(jpeg) for jpeg in frames]
+
+def save_jpeg(filename, jpeg_data):
+    """Write one JPEG, or a burst as name_0.jpg, name_1.jpg, ..."""
+    if not isinstance(jpeg_data, list):
+        with open(filename, 'wb') as f:
+            f.write(jpeg_data)
+        return
+    stem, ext = os.path.splitext(filename)
+    for i, jpeg in enumerate(jpeg_data):
+        with open(f"{stem}_{i}{ext}", 'wb') as f:
+            f.write(jpeg)
+
+def main():
+    from sim_camera import SimulatedCamera, load_frames
+    from sync_capture_test import CameraCapture, analyze_frame
+
+    count = 30
+    output_dir = tempfile.mkdtemp(prefix='pipeline_')
+    with SimulatedCamera(load_frames()) as sim:
+        camera = CameraCapture(sim.port, sim.baud)
+
+        # Baseline: the original strictly serial loop
+        start = time.monotonic()
+        for i in range(count):
+            jpeg_data = camera.capture()
+            if jpeg_data is not None:
+                with open(os.path.join(output_dir, f"serial_{i}.jpg"), 'wb') as f:
+                    f.write(jpeg_data)
+                analyze_frame(jpeg_data, None)
+        serial_elapsed = time.monotonic() - start
+
+        pipe = CapturePipeline(camera, analyze_frame).start()
+        start = time.monotonic()
+        for i in range(count):
+            pipe.submit({'expected': None, 'filename': os.path.join(output_dir, f"pipe_{i}.jpg")})
+        pipe.close()
+        pipe_elapsed = time.monotonic() - start
+        camera.close()
+
+    print(f"Serial loop: {count / serial_elapsed:5.2f} frames/s")
+    print(f"Pipeline:    {count / pipe_elapsed:5.2f} frames/s")
+    pipe.report()
+
+if __name__ == "__main__":
+    main()
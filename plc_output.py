@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+PLC Output Scheduler
+Drives the accept/reject lines from a dedicated timer thread instead of
+set_plc()'s raise / sleep(0.1) / lower in the main loop:
+
+    plc = PulseScheduler(open_gpio()).start()
+    plc.pulse('REJECT', seen_ns)   # fires when the tyre reaches the gate
+    ...
+    plc.close()
+
+pulse() only queues two edges (raise at the fire time, lower PULSE_MS
+later) and returns in microseconds, so ultrasonic polling and the next
+capture never wait on the PLC. The fire time is when the tyre was seen at
+the capture zone plus its belt travel to the reject gate. Edges sit in a
+heap on the monotonic clock; the thread sleeps until just before the next
+one and spins the rest, as TriggerScheduler does.
+
+Consecutive tyres closer than PULSE_MS at the gate give overlapping pulses:
+
+- accept and reject are interlocked as set_plc() had them: raising one line
+  drops the other, so the newest verdict holds the gate and both lines are
+  never high together
+- on the same line, the running pulse is ended and the new one starts
+  SPLIT_GAP_MS later, so a PLC counting rising edges sees one per tyre
+  (a tyre arriving inside that gap takes the restart over)
+
+Keep PULSE_MS below the closest tyre spacing at the gate so neither happens
+in normal running; report() counts both.
+
+The GPIO layer is pluggable: RPi.GPIO on the Pi (rpi-lgpio on a Pi 5), a
+simulated backend that records every edge anywhere else. Run directly to
+measure pulse timing against the old blocking set_plc() loop, or with
+--check for the interlock and edge-count check.
+"""
+
+import argparse
+import heapq
+import random
+import sys
+import threading
+import time
+
+from metrics import METRICS
+from trigger_scheduler import LatenessHistogram
+
+ACCEPT_PIN = 22
+REJECT_PIN = 23
+PULSE_MS = 100
+SPLIT_GAP_MS = 5  # line held low between back-to-back pulses on one pin
+GATE_DISTANCE_MM = 600  # belt travel from the capture zone to the reject gate
+BELT_SPEED_MM_S = 300
+SPIN_NS = 500_000  # final stretch before an edge spent spinning, not sleeping
+
+class SimulatedGPIO:
+    """Stands in for RPi.GPIO off the Pi: records every edge with its monotonic time"""
+
+    def __init__(self):
+        self.levels = {}
+        self.edges = []  # (monotonic_ns, pin, level)
+
+    def setup(self, pin):
+        self.levels[pin] = False
+
+    def output(self, pin, level):
+        self.edges.append((time.monotonic_ns(), pin, level))
+        self.levels[pin] = level
+
+    def cleanup(self):
+        pass
+
+class RPiGPIO:
+    """BCM-numbered output pins through RPi.GPIO"""
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM)
+        self.gpio = GPIO
+        self.pins = []
+
+    def setup(self, pin):
+        self.gpio.setup(pin, self.gpio.OUT, initial=self.gpio.LOW)
+        self.pins.append(pin)
+
+    def output(self, pin, level):
+        self.gpio.output(pin, level)
+
+    def cleanup(self):
+        self.gpio.cleanup(self.pins)
+
+def open_gpio(simulate=None):
+    """RPi.GPIO when it is available, else the simulated backend (simulate forces either)"""
+    if not simulate:
+        try:
+            return RPiGPIO()
+        except (ImportError, RuntimeError):
+            if simulate is False:
+                raise
+    return SimulatedGPIO()
+
+class PulseScheduler:
+    """Timed accept/reject pulses from a timer thread; pulse() never blocks"""
+
+    def __init__(self, gpio, pins=None, pulse_ms=PULSE_MS,
+                 gate_delay=GATE_DISTANCE_MM / BELT_SPEED_MM_S, spin_ns=SPIN_NS,
+                 split_gap_ms=SPLIT_GAP_MS):
+        self.gpio = gpio
+        self.pins = pins or {'ACCEPT': ACCEPT_PIN, 'REJECT': REJECT_PIN}
+        self.pulse_ns = int(pulse_ms * 1e6)
+        self.gap_ns = int(split_gap_ms * 1e6)
+        self.gate_delay = gate_delay  # s from the capture zone to the gate
+        self.spin_ns = spin_ns
+        self.lateness = LatenessHistogram()  # actual pin changes vs their scheduled time
+        self.stats = {'pulses': 0, 'interlocked': 0, 'split': 0, 'late': 0}
+        self._heap = []
+        self._seq = 0
+        self._owner = dict.fromkeys(self.pins.values())  # pulse currently driving each pin high
+        self._newest = None  # last pulse to start; a split pulse only re-raises if still newest
+        self._cv = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='plc', daemon=True)
+        for pin in self.pins.values():
+            gpio.setup(pin)
+            gpio.output(pin, False)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def pulse(self, verdict, seen_ns=None, delay=None):
+        """Queue a pulse for verdict, delay s (default: gate travel) after seen_ns (default: now)
+
+        verdict is 'ACCEPT' or anything else for reject, as set_plc() treated
+        it. A fire time already in the past fires at once and counts as late.
+        """
+        pin = self.pins['ACCEPT' if verdict == 'ACCEPT' else 'REJECT']
+        now = time.monotonic_ns()
+        start = (now if seen_ns is None else seen_ns) + int((self.gate_delay if delay is None else delay) * 1e9)
+        with self._cv:
+            if start < now:
+                self.stats['late'] += 1
+                start = now
+            pulse_id = self.stats['pulses']
+            self._push(start, 'start', pin, pulse_id)
+            self._push(start + self.pulse_ns, 'end', pin, pulse_id)
+            self.stats['pulses'] += 1
+            self._cv.notify()
+        return start
+
+    def pending(self):
+        with self._cv:
+            return sum(1 for edge in self._heap if edge[2] == 'start')
+
+    def close(self):
+        """Fire every queued pulse, then leave all lines low"""
+        with self._cv:
+            self._closing = True
+            self._cv.notify()
+        if self._thread.is_alive():
+            self._thread.join()
+        for pin in self.pins.values():
+            self.gpio.output(pin, False)
+        self.gpio.cleanup()
+
+    def _push(self, at_ns, kind, pin, pulse_id):
+        heapq.heappush(self._heap, (at_ns, self._seq, kind, pin, pulse_id))
+        self._seq += 1
+
+    def _run(self):
+        while True:
+            with self._cv:
+                if not self._heap:
+                    if self._closing:
+                        return
+                    self._cv.wait()
+                    continue
+                at_ns = self._heap[0][0]
+                remaining = at_ns - time.monotonic_ns()
+                if remaining > self.spin_ns:
+                    # Woken early if a pulse() queues an earlier edge
+                    self._cv.wait((remaining - self.spin_ns) / 1e9)
+                    continue
+                _, _, kind, pin, pulse_id = heapq.heappop(self._heap)
+                if kind == 'start' and self._owner[pin] is not None:
+                    # Same line still up for the previous tyre: end it, restart after the gap
+                    self.stats['split'] += 1
+                    self._owner[pin] = None
+                    self._push(at_ns + self.gap_ns, 'raise', pin, pulse_id)
+                    self._newest = pulse_id
+                    kind = 'drop'
+            while time.monotonic_ns() < at_ns:
+                pass
+            self._edge(at_ns, kind, pin, pulse_id)
+
+    def _edge(self, at_ns, kind, pin, pulse_id):
+        if kind == 'end':
+            if self._owner[pin] != pulse_id:
+                return  # cut short by a later pulse, already low
+            self._owner[pin] = None
+            level = False
+        elif kind == 'drop':
+            level = False
+        elif kind == 'raise' and self._newest != pulse_id:
+            return  # a later tyre's pulse started inside the gap
+        else:
+            # start or raise: the other line goes low first, as set_plc() did
+            for other in self.pins.values():
+                if other != pin and self._owner[other] is not None:
+                    self._owner[other] = None
+                    self.gpio.output(other, False)
+                    self.stats['interlocked'] += 1
+            self._owner[pin] = pulse_id
+            self._newest = pulse_id
+            level = True
+        self.gpio.output(pin, level)
+        late = time.monotonic_ns() - at_ns
+        self.lateness.record(late)
+        METRICS.observe('plc_edge_late', late / 1e9)
+
+    def report(self):
+        print(f"PLC edge lateness: {self.lateness.summary()}")
+        print(self.lateness.render())
+        print(f"  pulses {self.stats['pulses']} | interlocked {self.stats['interlocked']} | "
+              f"split {self.stats['split']} | queued late {self.stats['late']}")
+
+def blocking_loop(tyres, gpio, pulse_ms=PULSE_MS):
+    """The handoff's set_plc(): every verdict holds the main loop for the whole pulse"""
+    start = time.monotonic()
+    for _, verdict in tyres:
+        pin = ACCEPT_PIN if verdict == 'ACCEPT' else REJECT_PIN
+        gpio.output(pin, True)
+        time.sleep(pulse_ms / 1000)
+        gpio.output(pin, False)
+    return time.monotonic() - start
+
+def make_tyres(count, spacing, seed=0):
+    """(s after start, verdict) with exponential gaps, so some gate pulses overlap"""
+    rng = random.Random(seed)
+    t, tyres = 0.05, []
+    for _ in range(count):
+        tyres.append((t, 'REJECT' if rng.random() < 0.3 else 'ACCEPT'))
+        t += rng.expovariate(1 / spacing)
+    return tyres
+
+def pulse_widths(edges):
+    """Widths in ms of every high period in a SimulatedGPIO edge log"""
+    up, widths = {}, []
+    for t, pin, level in edges:
+        if level and pin not in up:
+            up[pin] = t
+        elif not level and pin in up:
+            widths.append((t - up.pop(pin)) / 1e6)
+    return widths
+
+def audit(edges):
+    """(rising edges per pin, times both lines were high at once) from an edge log"""
+    levels, rising, overlaps = {}, {}, 0
+    for _, pin, level in edges:
+        if level and not levels.get(pin):
+            rising[pin] = rising.get(pin, 0) + 1
+        levels[pin] = level
+        overlaps += level and sum(levels.values()) > 1
+    return rising, overlaps
+
+def interlock_check():
+    """Overlapping accept/reject and back-to-back rejects: one edge per tyre, never both high"""
+    gpio = SimulatedGPIO()
+    plc = PulseScheduler(gpio, gate_delay=0).start()
+    start = time.monotonic_ns() + 50_000_000
+    tyres = [(20, 'ACCEPT'), (70, 'REJECT'), (150, 'REJECT'), (200, 'REJECT'), (400, 'ACCEPT')]
+    for ms, verdict in tyres:
+        plc.pulse(verdict, start + ms * 1_000_000)
+    plc.close()
+    rising, overlaps = audit(gpio.edges)
+    ok = overlaps == 0 and rising == {ACCEPT_PIN: 2, REJECT_PIN: 3}
+    print(f"{'✓' if ok else '✗'} Interlock check: rising edges {rising} for 2 accepts + 3 rejects | "
+          f"both lines high {overlaps} times | interlocked {plc.stats['interlocked']}, "
+          f"split {plc.stats['split']}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser(description="Non-blocking PLC pulses vs the blocking set_plc() loop")
+    ap.add_argument('--tyres', type=int, default=100)
+    ap.add_argument('--spacing', type=float, default=0.25, help="mean s between tyres")
+    ap.add_argument('--gate-delay', type=float, default=0.5, help="s of belt travel to the gate")
+    ap.add_argument('--load', action='store_true', help="run paint dot analysis in a thread meanwhile")
+    ap.add_argument('--check', action='store_true', help="only run the interlock / edge-count check")
+    args = ap.parse_args()
+
+    if args.check:
+        sys.exit(0 if interlock_check() else 1)
+
+    tyres = make_tyres(args.tyres, args.spacing)
+    span = tyres[-1][0]
+    print(f"{len(tyres)} tyres over {span:.1f}s | {PULSE_MS}ms pulses | gate {args.gate_delay * 1000:.0f}ms "
+          f"after the capture zone{' | analysis load' if args.load else ''}")
+    print("=" * 70)
+
+    took = blocking_loop(tyres[:20], SimulatedGPIO())
+    print(f"Blocking set_plc(): main loop held {took / 20 * 1000:.1f}ms per tyre -> at most "
+          f"{20 / took:.1f} tyres/s, whatever the belt does")
+
+    stop = threading.Event()
+    load = None
+    if args.load:
+        import generate_test_video as gtv
+        from detector import Detector
+
+        frame = gtv.ConveyorRenderer().render(70)
+
+        def analyse():
+            detector = Detector()
+            while not stop.is_set():
+                detector.detect(frame)
+        load = threading.Thread(target=analyse)
+        load.start()
+
+    gpio = SimulatedGPIO()
+    plc = PulseScheduler(gpio, gate_delay=args.gate_delay).start()
+    start = time.monotonic_ns()
+    call_ns = []
+    for t, verdict in tyres:
+        seen = start + int(t * 1e9)
+        while time.monotonic_ns() < seen:
+            time.sleep(0.0005)
+        t0 = time.monotonic_ns()
+        plc.pulse(verdict, seen)
+        call_ns.append(time.monotonic_ns() - t0)
+    plc.close()
+    stop.set()
+    if load:
+        load.join()
+
+    call_ns.sort()
+    widths = sorted(pulse_widths(gpio.edges))
+    rising, overlaps = audit(gpio.edges)
+    print(f"Scheduler: pulse() p50 {call_ns[len(call_ns) // 2] / 1000:.1f}us, "
+          f"max {call_ns[-1] / 1000:.1f}us in the main loop")
+    plc.report()
+    print(f"  {sum(rising.values())} rising edges for {len(tyres)} tyres | both lines high {overlaps} times | "
+          f"widths {widths[0]:.2f}-{widths[-1]:.2f}ms (cut short when the next tyre overlaps)")
+    interlock_check()
+
+if __name__ == "__main__":
+    main()
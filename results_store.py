@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Inspection Results Store
+Local SQLite database of every inspection, written by a background thread
+so the capture pipeline never waits on disk:
+
+    store = ResultStore("capture_test/inspections.db").start()
+    store.record(result, jpeg_data)       # queued; returns immediately
+    store.hourly_rates(since=time.time() - 86400)
+    store.close()                          # flushes what is still queued
+
+Rows are group-committed, every BATCH_ROWS rows or BATCH_MS after the first
+row of a batch, whichever comes first, in WAL mode so dashboard reads never
+block the writer. Frames are stored once per content hash (BLAKE2b) in a
+frames table, or in a FrameArchive when one is given, instead of as loose
+tyre_{i}_{type}.jpg files. An hourly rollup is kept in the same transaction
+as the rows, so reject rates come back in milliseconds however many rows
+there are. Indexes on (ts, verdict), (verdict, ts) and solidity serve the
+row-level queries.
+
+Run directly for the sustained-ingest and query benchmark.
+"""
+
+import argparse
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+
+from frame_archive import frame_key
+from frame_parser import FrameParser, encode_frame
+from metrics import METRICS
+
+BATCH_ROWS = 500  # group commit after this many rows...
+BATCH_MS = 200  # ...or this long after the first row of the batch
+QUEUE_SIZE = 10000  # rows waiting for the writer before record() blocks
+HOUR = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inspections (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    tyre_id INTEGER,
+    verdict TEXT NOT NULL,
+    expected TEXT,
+    correct INTEGER,
+    solidity REAL,
+    area INTEGER,
+    circularity REAL,
+    frame_hash TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_inspections_ts ON inspections(ts, verdict);
+CREATE INDEX IF NOT EXISTS ix_inspections_verdict ON inspections(verdict, ts);
+CREATE INDEX IF NOT EXISTS ix_inspections_solidity ON inspections(solidity);
+CREATE TABLE IF NOT EXISTS frames (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    jpeg BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER PRIMARY KEY,
+    total INTEGER NOT NULL,
+    accepted INTEGER NOT NULL,
+    rejected INTEGER NOT NULL,
+    failed INTEGER NOT NULL
+);
+"""
+
+INSERT_ROW = ("INSERT INTO inspections (ts, tyre_id, verdict, expected, correct, solidity, "
+              "area, circularity, frame_hash, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+INSERT_FRAME = "INSERT OR IGNORE INTO frames (hash, size, jpeg) VALUES (?, ?, ?)"
+UPSERT_HOUR = """
+INSERT INTO hourly (hour, total, accepted, rejected, failed) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(hour) DO UPDATE SET total = total + excluded.total,
+    accepted = accepted + excluded.accepted, rejected = rejected + excluded.rejected,
+    failed = failed + excluded.failed
+"""
+
+def connect(path):
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: a crash loses at most the last commits, never corrupts
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA busy_timeout=5000")
+    return db
+
+def frame_hash(jpeg):
+    return frame_key(jpeg).hex()
+
+def outcome(verdict):
+    """'accepted', 'rejected' or 'failed' for the hourly rollup"""
+    if verdict == 'ACCEPT':
+        return 'accepted'
+    if verdict == 'ERROR':
+        return 'failed'
+    return 'rejected'  # REJECT, REJECT (no dot) and NO_DOT all send the tyre off the line
+
+class ResultStore:
+    """SQLite inspection store with a batching writer thread"""
+
+    def __init__(self, path, batch_rows=BATCH_ROWS, batch_ms=BATCH_MS, queue_size=QUEUE_SIZE,
+                 archive=None):
+        self.path = path
+        self.archive = archive  # FrameArchive for the JPEGs; None keeps them in the frames table
+        self.batch_rows = batch_rows
+        self.batch_s = batch_ms / 1000
+        self.db = connect(path)
+        self.db.executescript(SCHEMA)
+        self.queue = queue.Queue(queue_size)
+        self.stats = {'rows': 0, 'frames': 0, 'commits': 0, 'errors': 0, 'lost': 0}
+        self.commit_ms = []  # per group commit, for the benchmark
+        self._read_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+        return self
+
+    def record(self, result, jpeg_data=None, ts=None):
+        """Queue one inspection result (and its frame, or list of burst frames)
+
+        Dropped and counted as lost if the writer is gone, rather than
+        blocking the caller on a queue nothing drains.
+        """
+        item = (time.time() if ts is None else ts, result, jpeg_data)
+        try:
+            self.queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        while self._writer_alive():
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+        self.stats['lost'] += 1
+
+    def stop(self):
+        """Commit everything queued and stop the writer; start() resumes"""
+        if self._thread:
+            while self._writer_alive():
+                try:
+                    self.queue.put(None, timeout=1)
+                    break
+                except queue.Full:
+                    pass
+            self._thread.join()
+            self._thread = None
+
+    def _writer_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def close(self):
+        """Stop the writer and checkpoint the WAL into the database"""
+        self.stop()
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.db.execute("PRAGMA optimize")
+        self.db.close()
+
+    def _writer(self):
+        db = connect(self.path)
+        done = False
+        while not done:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_s
+            while len(batch) < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+            try:
+                self._commit(db, batch)
+            except Exception as e:
+                # Disk full, locked past busy_timeout, archive failure: lose this batch, keep going
+                self.stats['errors'] += 1
+                self.stats['lost'] += len(batch)
+                METRICS.count('store_errors')
+                print(f"⚠️ Results store: {len(batch)} rows not written: {e}")
+        db.close()
+
+    def _commit(self, db, batch):
+        t0 = time.perf_counter()
+        rows, frames, hours = [], {}, {}
+        for ts, result, jpeg_data in batch:
+            hashes = []
+            # One frame (bytes, or the parser's memoryview) or a list of burst frames
+            frames_in = jpeg_data if isinstance(jpeg_data, list) else [jpeg_data] if jpeg_data is not None else []
+            for jpeg in frames_in:
+                if self.archive is not None:
+                    hashes.append(self.archive.append(jpeg, ts))
+                    continue
+                h = frame_hash(jpeg)
+                frames[h] = jpeg
+                hashes.append(h)
+            verdict = 'ERROR' if 'error' in result else result.get('verdict', 'ERROR')
+            correct = result.get('correct')
+            rows.append((ts, result.get('tyre_id'), verdict, result.get('expected'),
+                         None if correct is None else int(correct), result.get('solidity'),
+                         result.get('area'), result.get('circularity'),
+                         ','.join(hashes) or None, result.get('error')))
+            counts = hours.setdefault(int(ts // HOUR) * HOUR,
+                                      {'total': 0, 'accepted': 0, 'rejected': 0, 'failed': 0})
+            counts['total'] += 1
+            counts[outcome(verdict)] += 1
+        with db:
+            db.executemany(INSERT_ROW, rows)
+            db.executemany(INSERT_FRAME, ((h, len(j), j) for h, j in frames.items()))
+            db.executemany(UPSERT_HOUR, ((hour, c['total'], c['accepted'], c['rejected'], c['failed'])
+                                         for hour, c in hours.items()))
+        self.stats['rows'] += len(rows)
+        self.stats['frames'] += len(frames)
+        self.stats['commits'] += 1
+        self.commit_ms.append((time.perf_counter() - t0) * 1000)
+
+    # Queries: the store's own connection, safe alongside the writer thanks to WAL
+
+    def _query(self, sql, args=()):
+        with self._read_lock:
+            return self.db.execute(sql, args).fetchall()
+
+    def hourly_rates(self, since=0, until=None):
+        """[(hour start, total, rejected, reject rate)] from the rollup"""
+        rows = self._query("SELECT hour, total, rejected FROM hourly WHERE hour >= ? AND hour < ? "
+                           "ORDER BY hour", (int(since // HOUR) * HOUR, until or float('inf')))
+        return [(hour, total, rejected, rejected / total if total else 0.0)
+                for hour, total, rejected in rows]
+
+    def hourly_rates_scan(self, since=0, until=None):
+        """The same figures computed from the rows (covered by the (ts, verdict) index)"""
+        return self._query(
+            "SELECT CAST(ts / 3600 AS INTEGER) * 3600 AS hour, COUNT(*), "
+            "SUM(verdict != 'ACCEPT' AND verdict != 'ERROR') FROM inspections "
+            "WHERE ts >= ? AND ts < ? GROUP BY hour ORDER BY hour",
+            (int(since // HOUR) * HOUR, until or float('inf')))
+
+    def recent(self, verdict=None, limit=50):
+        """Newest inspections, optionally only one verdict"""
+        if verdict is None:
+            return self._query("SELECT * FROM inspections ORDER BY ts DESC LIMIT ?", (limit,))
+        return self._query("SELECT * FROM inspections WHERE verdict = ? ORDER BY ts DESC LIMIT ?",
+                           (verdict, limit))
+
+    def borderline(self, low, high, limit=100):
+        """Inspections with solidity in [low, high], e.g. either side of the threshold"""
+        return self._query("SELECT * FROM inspections WHERE solidity BETWEEN ? AND ? "
+                           "ORDER BY solidity LIMIT ?", (low, high, limit))
+
+    def frame(self, hash_):
+        if self.archive is not None:
+            return self.archive.get(hash_)
+        row = self._query("SELECT jpeg FROM frames WHERE hash = ?", (hash_,))
+        return row[0][0] if row else None
+
+    def count(self):
+        return self._query("SELECT COUNT(*) FROM inspections")[0][0]
+
+def timed(fn, repeats=5):
+    """Best-of-repeats ms and the last return value"""
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        value = fn()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best, value
+
+def synthetic_results(count, start, rate, seed=1):
+    """count results, one every 1/rate s from start, with ~8% rejects"""
+    import random
+    rng = random.Random(seed)
+    for i in range(count):
+        solidity = round(rng.gauss(0.96, 0.03), 3)
+        verdict = 'ACCEPT' if solidity >= 0.92 else 'REJECT'
+        yield start + i / rate, {'tyre_id': i, 'verdict': verdict, 'expected': verdict,
+                                 'correct': True, 'solidity': solidity,
+                                 'area': rng.randint(300, 600), 'circularity': 0.9}
+
+def main():
+    ap = argparse.ArgumentParser(description="Results store ingest and query benchmark")
+    ap.add_argument('--rows', type=int, default=1_000_000, help="inspections to ingest")
+    ap.add_argument('--rate', type=float, default=1.0, help="simulated tyres/s (spreads timestamps)")
+    ap.add_argument('--frames', type=int, default=2000, help="rows in a second run that carry a frame")
+    ap.add_argument('--db', help="database path (default: a temporary directory)")
+    args = ap.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='store_'), 'inspections.db')
+    start = time.time() - args.rows / args.rate
+
+    store = ResultStore(path).start()
+    producer = []
+    t0 = time.perf_counter()
+    for ts, result in synthetic_results(args.rows, start, args.rate):
+        t1 = time.perf_counter()
+        store.record(result, ts=ts)
+        producer.append(time.perf_counter() - t1)
+    queued = time.perf_counter() - t0
+    store.stop()
+    elapsed = time.perf_counter() - t0
+    producer.sort()
+    commits = sorted(store.commit_ms)
+    print(f"Ingest: {args.rows} rows in {elapsed:.1f}s = {args.rows / elapsed:,.0f} rows/s sustained "
+          f"({store.stats['commits']} group commits)")
+    print(f"  record() p50 {producer[len(producer) // 2] * 1e6:.1f}us | p99 "
+          f"{producer[int(len(producer) * 0.99)] * 1e6:.1f}us | backlog committed "
+          f"{elapsed - queued:.1f}s after the last record()")
+    print(f"  Group commit p50 {commits[len(commits) // 2]:.1f}ms | p99 "
+          f"{commits[int(len(commits) * 0.99)]:.1f}ms | max {commits[-1]:.1f}ms")
+
+    # Frames: JPEG-sized payloads, every tenth one a repeat of an earlier frame
+    frames = [os.urandom(40_000) for _ in range(max(1, args.frames * 9 // 10))]
+    store.start()
+    t0 = time.perf_counter()
+    for i, (ts, result) in enumerate(synthetic_results(args.frames, time.time(), args.rate, seed=2)):
+        store.record(result, frames[i % len(frames)], ts=ts)
+    store.stop()
+    elapsed = time.perf_counter() - t0
+    print(f"  With 40KB frames: {args.frames / elapsed:,.0f} rows/s | "
+          f"{len(frames)} unique frames stored for {args.frames} rows")
+
+    # Frames as the camera hands them over: memoryviews from the frame parser
+    parser = FrameParser()
+    views = parser.feed(b''.join(encode_frame(b'\xff\xd8' + f + b'\xff\xd9') for f in frames[:3]))
+    store.start()
+    for view in views:
+        store.record({'verdict': 'ACCEPT', 'correct': True}, view)
+    store.stop()
+    stored = sum(store.frame(frame_hash(bytes(v))) == bytes(v) for v in views)
+    print(f"  Parser memoryview frames: {stored}/{len(views)} stored and read back | "
+          f"errors {store.stats['errors']}")
+
+    day = time.time() - 86400
+    total = store.count()
+    print(f"\nQueries over {total:,} rows ({os.path.getsize(path) / 1e6:.0f} MB + WAL):")
+    ms, rates = timed(lambda: store.hourly_rates(day))
+    print(f"  Hourly reject rate, last 24h (rollup):   {ms:7.2f}ms, {len(rates)} hours")
+    ms, _ = timed(lambda: store.hourly_rates())
+    print(f"  Hourly reject rate, all time (rollup):   {ms:7.2f}ms")
+    ms, scan = timed(lambda: store.hourly_rates_scan(day), repeats=3)
+    print(f"  Hourly reject rate, last 24h (row scan): {ms:7.2f}ms")
+    ms, _ = timed(lambda: store.recent('REJECT'))
+    print(f"  Latest 50 rejects:                       {ms:7.2f}ms")
+    ms, rows = timed(lambda: store.borderline(0.915, 0.925))
+    print(f"  100 borderline rows (solidity 0.915-0.925): {ms:4.2f}ms")
+    rollup = {hour: (n, rejected) for hour, n, rejected, _ in rates}
+    mismatches = sum(1 for hour, n, rejected in scan if rollup.get(hour) != (n, rejected))
+    print(f"  Rollup vs row scan: {mismatches} mismatched hours")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Serial Record / Replay
+Records a capture run as a compact binary log: every chunk read from or
+written to the camera's serial port, every trigger and every verdict, each
+stamped with its monotonic time. Replay feeds the log back through the
+frame parser, detector and verdict logic (the same CapturePipeline), either
+as fast as possible or in real time:
+
+    TYRE_RECORD=shift.tlog python3 sync_capture_test.py     # record a run
+    python3 serial_replay.py shift.tlog                      # max throughput
+    python3 serial_replay.py shift.tlog --realtime           # original timing
+    python3 serial_replay.py --demo                          # record + replay a sim run
+
+Replays are deterministic, so a run can be re-scored after a detector change
+and compared verdict by verdict with what was decided on the day.
+
+Log format: MAGIC, then a header (wall clock start, monotonic start ns), then
+records of [kind u8][t_ns u64 since start][length u32][payload].
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from frame_parser import FrameParser, frame_ts_ms
+
+MAGIC = b'TYRELOG1'
+HEADER = struct.Struct('<dQ')  # wall clock start (s), monotonic start (ns)
+RECORD = struct.Struct('<BQI')  # kind, t_ns since start, payload length
+
+# Record kinds
+RX, TX, TRIGGER, SKIP, CAPTURE, RESULT = range(6)
+
+CAPTURE_COMMANDS = (b'C', b'X')  # commands that start a frame, see CameraCapture
+RESULT_FIELDS = ('verdict', 'solidity', 'area', 'error')
+
+class SerialLog:
+    """Append-only binary log writer; safe to call from several threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self.start_ns = time.monotonic_ns()
+        self.records = 0
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + HEADER.pack(time.time(), self.start_ns))
+        self._lock = threading.Lock()
+
+    def write(self, kind, payload=b''):
+        t = time.monotonic_ns() - self.start_ns
+        with self._lock:
+            self._file.write(RECORD.pack(kind, t, len(payload)))
+            self._file.write(payload)
+            self.records += 1
+
+    def trigger(self, job):
+        self.write(TRIGGER, _to_json(job))
+
+    def skip(self):
+        """The trigger logged last was not accepted by the pipeline"""
+        self.write(SKIP)
+
+    def capture(self, ok):
+        self.write(CAPTURE, b'\x01' if ok else b'\x00')
+
+    def result(self, result):
+        trigger = result.get('trigger', {})
+        self.write(RESULT, _to_json({'tyre_index': trigger.get('tyre_index'),
+                                     **{k: result.get(k) for k in RESULT_FIELDS}}))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def _to_json(obj):
+    return json.dumps(obj, default=str, separators=(',', ':')).encode()
+
+class RecordingSerial:
+    """Wraps a pyserial port and logs every chunk read or written"""
+
+    def __init__(self, ser, log):
+        self._ser = ser
+        self._log = log
+
+    def read(self, size=1):
+        data = self._ser.read(size)
+        if data:
+            self._log.write(RX, data)
+        return data
+
+    def readline(self):
+        data = self._ser.readline()
+        if data:
+            self._log.write(RX, data)
+        return data
+
+    def write(self, data):
+        self._log.write(TX, bytes(data))
+        return self._ser.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+    def __setattr__(self, name, value):
+        # The port timeout is adjusted by read_frame; pass it through
+        if name.startswith('_'):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._ser, name, value)
+
+class RecordingCamera:
+    """Wraps a CameraCapture: logs its serial traffic and where each capture ended"""
+
+    def __init__(self, camera, log):
+        camera.ser = RecordingSerial(camera.ser, log)
+        self._camera = camera
+        self._log = log
+
+    def capture(self):
+        frame = self._camera.capture()
+        self._log.capture(frame is not None)
+        return frame
+
+    def __getattr__(self, name):
+        return getattr(self._camera, name)
+
+def read_log(path):
+    """Returns (wall_start, [(kind, t_ns, payload memoryview), ...]) without copying payloads"""
+    with open(path, 'rb') as f:
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a serial log")
+    wall_start, _ = HEADER.unpack_from(data, len(MAGIC))
+    pos = len(MAGIC) + HEADER.size
+    records = []
+    while pos + RECORD.size <= len(data):
+        kind, t_ns, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        if pos + length > len(data):
+            break  # the recorder was killed mid-write
+        records.append((kind, t_ns, data[pos:pos + length]))
+        pos += length
+    return wall_start, records
+
+class Recording:
+    """A parsed log: accepted triggers, per-capture serial traffic and recorded verdicts"""
+
+    def __init__(self, path):
+        self.wall_start, records = read_log(path)
+        self.triggers = []  # (t_ns, job)
+        self.captures = []  # (t_ns at the end, ok, [(kind, t_ns, payload), ...])
+        self.results = []
+        self.bytes = 0
+        traffic = []
+        for kind, t_ns, payload in records:
+            if kind in (RX, TX):
+                traffic.append((kind, t_ns, payload))
+                self.bytes += len(payload) if kind == RX else 0
+            elif kind == TRIGGER:
+                self.triggers.append((t_ns, json.loads(bytes(payload))))
+            elif kind == SKIP:
+                self.triggers.pop()
+            elif kind == CAPTURE:
+                self.captures.append((t_ns, payload[0] == 1, traffic))
+                traffic = []
+            elif kind == RESULT:
+                self.results.append(json.loads(bytes(payload)))
+
+class ReplayCamera:
+    """Stands in for CameraCapture: re-parses each recorded capture's serial bytes"""
+
+    def __init__(self, recording, realtime=False):
+        self.captures = iter(recording.captures)
+        self.realtime = realtime
+        self.text = bytearray()  # status lines around the current capture, as CameraCapture keeps
+        self.parser = FrameParser(on_skip=self.text.extend)
+        self.frame_time = None  # log time (s) the last frame was taken, so tracking replays exactly
+        self.start_ns = None  # monotonic_ns of log time 0, set by replay()
+        self.mismatches = 0  # captures whose recorded outcome the parser did not reproduce
+
+    def capture(self):
+        capture = next(self.captures, None)
+        if capture is None:
+            return None  # the log ended before this trigger was captured
+        t_end, ok, traffic = capture
+        frame = None
+        sent = t_end
+        for kind, t_ns, payload in traffic:
+            if kind == TX:
+                if bytes(payload) in CAPTURE_COMMANDS:
+                    # CameraCapture resets the parser before every capture command
+                    self.parser.reset()
+                    self.text.clear()
+                    frame = None
+                    sent = t_ns
+            elif frame is None:
+                frames = self.parser.feed(payload)
+                if frames:
+                    frame = frames[0]
+        if (frame is not None) != ok:
+            self.mismatches += 1
+        self.frame_time = (sent + (frame_ts_ms(self.text) or 0) * 1e6) / 1e9
+        if self.realtime:
+            delay = self.start_ns + t_end - time.monotonic_ns()
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        return frame if ok else None
+
+def replay(path, realtime=False, workers=2, output_dir=None):
+    """Run a recording through the pipeline; returns (recording, camera, pipeline, results, seconds)"""
+    from pipeline import CapturePipeline
+    from sync_capture_test import analyze_burst, analyze_frame
+    from trigger_scheduler import TriggerScheduler
+    from tyre_tracker import TyreTracker
+
+    recording = Recording(path)
+    camera = ReplayCamera(recording, realtime)
+    # Triggers log how many frames each grabbed and whether tyres were tracked
+    first = recording.triggers[0][1] if recording.triggers else {}
+    burst = first.get('burst', 1)
+    tracker = TyreTracker() if first.get('tracked') else None
+    pipe = CapturePipeline(camera, analyze_burst if burst > 1 else analyze_frame,
+                           workers=workers, burst=burst, tracker=tracker)
+    jobs = []
+    for t_ns, job in recording.triggers:
+        job.pop('submitted', None)
+        job['filename'] = (os.path.join(output_dir, os.path.basename(job['filename']))
+                           if output_dir and job.get('filename') else None)
+        jobs.append((t_ns, job))
+
+    start = time.monotonic()
+    camera.start_ns = time.monotonic_ns()
+    pipe.start()
+    if realtime:
+        scheduler = TriggerScheduler(lambda job, block: pipe.submit(job, block))
+        for t_ns, job in jobs:
+            scheduler.add(t_ns / 1e9, job)
+        scheduler.run(camera.start_ns)
+    else:
+        for _, job in jobs:
+            pipe.submit(job)
+    results = pipe.close()
+    elapsed = time.monotonic() - start
+    return recording, camera, pipe, results, elapsed
+
+def compare(recorded, replayed):
+    """Pairs recorded and replayed verdicts per tyre; returns the differing pairs"""
+    by_tyre = {r.get('tyre_index'): r for r in recorded if r.get('verdict') or r.get('error')}
+    diffs = []
+    for r in replayed:
+        tyre = r['trigger'].get('tyre_index')
+        old = by_tyre.get(tyre)
+        if r.get('duplicate'):
+            continue
+        if old is not None and old.get('verdict') != r.get('verdict'):
+            diffs.append((tyre, old.get('verdict'), r.get('verdict')))
+    return diffs
+
+def print_replay(path, realtime, workers):
+    recording, camera, pipe, results, elapsed = replay(path, realtime, workers)
+    frames = sum(1 for r in results if 'error' not in r)
+    mode = "real time" if realtime else "max speed"
+    print(f"Replayed {path} ({mode}): {len(recording.triggers)} triggers, "
+          f"{len(recording.captures)} captures, {recording.bytes / 1e6:.2f} MB of serial data")
+    print(f"  {elapsed:.2f}s | {frames / elapsed:.1f} frames/s | "
+          f"{recording.bytes / elapsed / 1e6:.1f} MB/s through parser + detector")
+    print(f"  Parser: {camera.parser.summary()} | capture outcome mismatches {camera.mismatches}")
+    pipe.report()
+    if recording.results:
+        diffs = compare(recording.results, results)
+        print(f"  Verdicts vs recording: {len(results) - len(diffs)}/{len(results)} identical")
+        for tyre, old, new in diffs:
+            print(f"    ⚠️ Tyre {tyre}: recorded {old} -> replayed {new}")
+    return results
+
+def record_demo(path, count):
+    """Record a simulated run the way sync_capture_test.py does with TYRE_RECORD set"""
+    from pipeline import CapturePipeline
+    from sim_camera import SimulatedCamera, load_frames
+    from sync_capture_test import CameraCapture, analyze_frame
+    from trigger_scheduler import TriggerScheduler
+
+    log = SerialLog(path)
+    with SimulatedCamera(load_frames(), drop_rate=1e-6, seed=7) as sim:
+        camera = RecordingCamera(CameraCapture(sim.port, sim.baud), log)
+        pipe = CapturePipeline(camera, analyze_frame, on_result=log.result).start()
+
+        def fire(job, block):
+            log.trigger(job)
+            if not pipe.submit(job, block=block):
+                log.skip()
+                return False
+            return True
+
+        scheduler = TriggerScheduler(fire, 'skip')
+        for i in range(count):
+            scheduler.add(0.1 + i * 0.3, {'tyre_index': i, 'expected': None})
+        scheduler.run()
+        pipe.close()
+        camera.close()
+    log.close()
+    print(f"Recorded {log.records} records to {path} ({os.path.getsize(path) / 1e6:.2f} MB)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a recorded serial log through the pipeline")
+    ap.add_argument('log', nargs='?', help="log written with TYRE_RECORD=<path>")
+    ap.add_argument('--realtime', action='store_true', help="keep the recorded timing")
+    ap.add_argument('--workers', type=int, default=2, help="analysis threads")
+    ap.add_argument('--demo', type=int, nargs='?', const=30, metavar='N',
+                    help="record N triggers against the simulated camera, then replay them")
+    args = ap.parse_args()
+
+    if args.demo:
+        path = os.path.join(tempfile.mkdtemp(prefix='replay_'), 'demo.tlog')
+        record_demo(path, args.demo)
+        print()
+        print_replay(path, False, args.workers)
+        print()
+        print_replay(path, True, args.workers)
+    elif args.log:
+        print_replay(args.log, args.realtime, args.workers)
+    else:
+        ap.error("give a log to replay, or --demo")
+
+if __name__ == "__main__":
+    main()
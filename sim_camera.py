@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Simulated ESP32-CAM Serial Device
+Opens a pseudo-terminal that speaks the tyre_cam_firmware command set, so the
+capture scripts can run without hardware:
+
+    python3 sim_camera.py                 # serve until Ctrl-C, prints the port
+    TYRE_CAM_PORT=/dev/pts/5 python3 manual_test.py
+
+Frames come from the synthetic conveyor video (or are rendered directly by
+generate_test_video) and are sent with the real frame markers. Link speed,
+jitter, dropped bytes and truncated frames are configurable.
+"""
+
+import argparse
+import math
+import os
+import pty
+import random
+import select
+import threading
+import time
+import tty
+
+import cv2
+
+from frame_parser import FrameParser, encode_frame, read_frame
+import generate_test_video as gtv
+
+# Roughly the size/quality trade-off of the firmware's JPEG_QUALITY 15
+JPEG_QUALITY = 80
+CHUNK_SIZE = 256  # bytes written per throttled burst
+QVGA = (320, 240)
+SENSOR_PERIOD = 0.04  # OV2640 frame interval while armed (~25 fps at VGA)
+
+# Status lines, exactly as the firmware prints them
+RESPONSES = {
+    'S': "STATUS:OK",
+    'R': "RESOLUTION:QVGA",
+    'V': "RESOLUTION:VGA",
+    'L': "LED:ON",
+    'O': "LED:OFF",
+    'F': "EXPOSURE:FAST (need bright light!)",
+    'A': "EXPOSURE:AUTO",
+    'M': "EXPOSURE:MEDIUM",
+    'P': "ARMED",
+    'D': "DISARMED",
+}
+
+def load_frames(video_path=gtv.OUTPUT_PATH, count=30):
+    """Load VGA frames from the conveyor video, or render them if it doesn't exist"""
+    frames = []
+    if os.path.exists(video_path):
+        cap = cv2.VideoCapture(video_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+        step = max(1, total // count)
+        frame_num = 0
+        while len(frames) < count:
+            ok, img = cap.read()
+            if not ok:
+                break
+            if frame_num % step == 0:
+                frames.append(img)
+            frame_num += 1
+        cap.release()
+    else:
+        positions = gtv.tyre_start_positions()
+        total = gtv.FPS * gtv.DURATION_SEC
+        for frame_num in range(0, total, max(1, total // count)):
+            frames.append(gtv.render_frame(frame_num, positions))
+    return frames
+
+class SimulatedCamera:
+    """ESP32-CAM stand-in served over a pty"""
+
+    def __init__(self, frames, baud=921600, capture_delay=0.03, jitter=0.0,
+                 drop_rate=0.0, truncate_rate=0.0, seed=None):
+        self.baud = baud
+        self.capture_delay = capture_delay  # sensor exposure + JPEG encode
+        self.jitter = jitter  # max extra delay (s) per capture and per USB burst
+        self.drop_rate = drop_rate  # probability that any single byte is lost
+        self.truncate_rate = truncate_rate  # probability that a frame is cut short
+        self.rng = random.Random(seed)
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+        self.jpegs = {'VGA': [], 'QVGA': []}
+        for img in frames:
+            self.jpegs['VGA'].append(cv2.imencode('.jpg', img, params)[1].tobytes())
+            small = cv2.resize(img, QVGA, interpolation=cv2.INTER_AREA)
+            self.jpegs['QVGA'].append(cv2.imencode('.jpg', small, params)[1].tobytes())
+        self.resolution = 'VGA'
+        self.exposure = 'FAST'
+        self.led = False
+        self.armed = False
+        self._armed_at = 0.0
+        self.frame_index = 0
+        self.advance = True  # step to the next frame after every capture
+        self.stats = {'commands': 0, 'frames': 0, 'bytes': 0, 'dropped': 0, 'truncated': 0}
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._next_drop = self._drop_gap()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._println("# Initializing camera...")
+        self._println("STATUS:READY")
+        self._println("# Commands: C=capture, S=status, R=QVGA, V=VGA, L=LED on, O=LED off")
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        """Command loop, mirroring processCommand() in the firmware"""
+        while self._running:
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 64)
+            except OSError:
+                return
+            for cmd in data.decode('ascii', errors='ignore').upper():
+                self.stats['commands'] += 1
+                if cmd in 'CX':
+                    if self.armed:
+                        self._fire_frame()
+                    else:
+                        self._send_frame()
+                elif cmd in RESPONSES:
+                    if cmd in 'RV':
+                        self.resolution = 'QVGA' if cmd == 'R' else 'VGA'
+                    elif cmd in 'LO':
+                        self.led = cmd == 'L'
+                    elif cmd in 'FMA':
+                        self.exposure = RESPONSES[cmd].split(':')[1].split()[0]
+                    elif cmd in 'PD':
+                        self.armed = cmd == 'P'
+                        self._armed_at = time.monotonic()
+                    self._println(RESPONSES[cmd])
+
+    def _send_frame(self):
+        """Simulate capture latency, then send one framed JPEG over the throttled link"""
+        time.sleep(self.capture_delay + self.rng.uniform(0, self.jitter))
+        self._transmit_frame()
+
+    def _fire_frame(self):
+        """Armed fire: the sensor frame nearest the trigger is already encoded"""
+        # Frames complete every SENSOR_PERIOD after arming, like the grab task
+        now = time.monotonic()
+        k = int((now - self._armed_at) / SENSOR_PERIOD)
+        frame_time = self._armed_at + k * SENSOR_PERIOD
+        if k < 1 or now - frame_time > SENSOR_PERIOD / 2:
+            frame_time += SENSOR_PERIOD * (1 if k >= 1 else 1 - k)
+            time.sleep(frame_time - now)
+        self._println(f"FRAME_TS:{int((frame_time - now) * 1e6)}")
+        self._transmit_frame()
+
+    def _transmit_frame(self):
+        jpegs = self.jpegs[self.resolution]
+        data = encode_frame(jpegs[self.frame_index % len(jpegs)])
+        if self.advance:
+            self.frame_index += 1
+        if self.rng.random() < self.truncate_rate:
+            data = data[:self.rng.randrange(8, len(data))]
+            self.stats['truncated'] += 1
+        self.stats['frames'] += 1
+        self._write(data)
+
+    def _println(self, line):
+        self._write((line + "\r\n").encode())
+
+    def _drop_gap(self):
+        """Bytes until the next dropped byte (geometric distribution)"""
+        if self.drop_rate <= 0:
+            return math.inf
+        return int(math.log(1.0 - self.rng.random()) / math.log(1.0 - self.drop_rate))
+
+    def _write(self, data):
+        """Write at the configured baud rate (8N1 = 10 bits per byte)"""
+        start = time.monotonic()
+        sent = 0
+        for i in range(0, len(data), CHUNK_SIZE):
+            chunk = data[i:i + CHUNK_SIZE]
+            while self._next_drop < len(chunk):
+                chunk = chunk[:self._next_drop] + chunk[self._next_drop + 1:]
+                self.stats['dropped'] += 1
+                self._next_drop += self._drop_gap()
+            self._next_drop -= len(chunk)
+
+            sent += min(CHUNK_SIZE, len(data) - i)
+            delay = start + sent * 10 / self.baud - time.monotonic()
+            if self.jitter:
+                delay += self.rng.uniform(0, self.jitter) / 10
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                os.write(self.master, chunk)
+            except OSError:
+                return
+            self.stats['bytes'] += len(chunk)
+
+def benchmark(camera, count):
+    """Capture frames through the real parser and report link throughput"""
+    import serial
+
+    ser = serial.Serial(camera.port, camera.baud, timeout=2)
+    time.sleep(0.2)
+    ser.reset_input_buffer()
+    parser = FrameParser()
+
+    ok = 0
+    nbytes = 0
+    latencies = []
+    start = time.monotonic()
+    for _ in range(count):
+        t0 = time.monotonic()
+        ser.reset_input_buffer()
+        parser.reset()
+        ser.write(b'C')
+        jpeg_data = read_frame(ser, parser, 3)
+        latencies.append(time.monotonic() - t0)
+        if jpeg_data is not None:
+            ok += 1
+            nbytes += len(jpeg_data)
+    elapsed = time.monotonic() - start
+    ser.close()
+
+    latencies.sort()
+    print(f"  Captured {ok}/{count} frames in {elapsed:.2f}s ({ok / elapsed:.1f} fps)")
+    print(f"  Payload throughput: {nbytes / elapsed / 1024:.1f} KB/s "
+          f"(link max {camera.baud / 10 / 1024:.1f} KB/s)")
+    print(f"  Capture latency: p50 {latencies[len(latencies) // 2] * 1000:.0f}ms | "
+          f"max {latencies[-1] * 1000:.0f}ms")
+    print(f"  Parser resyncs: {parser.resyncs} | Camera stats: {camera.stats}")
+
+def benchmark_prearm(camera, count):
+    """Trigger-to-decision latency with plain 'C' captures versus pre-armed 'X'"""
+    from sync_capture_test import CameraCapture, analyze_frame
+
+    cam = CameraCapture(camera.port, camera.baud)
+    rng = random.Random(1)
+    p50 = {}
+    for mode in ('C', 'armed'):
+        if mode == 'armed' and not cam.arm():
+            print("  ❌ Camera did not arm")
+            break
+        latencies, offsets = [], []
+        for _ in range(count):
+            time.sleep(rng.uniform(0.05, 0.15))  # triggers land at random sensor phases
+            t0 = time.monotonic()
+            jpeg_data = cam.capture()
+            if jpeg_data is not None:
+                analyze_frame(jpeg_data, None)
+                latencies.append(time.monotonic() - t0)
+            if cam.frame_offset_ms is not None:
+                offsets.append(cam.frame_offset_ms)
+        latencies.sort()
+        p50[mode] = latencies[len(latencies) // 2] * 1000
+        line = (f"  {mode:6s} | {len(latencies)}/{count} | trigger->decision p50 {p50[mode]:6.1f}ms | "
+                f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f}ms")
+        if offsets:
+            line += f" | frame vs trigger {min(offsets):+.1f}..{max(offsets):+.1f}ms"
+        else:
+            line += f" | frame vs trigger +{camera.capture_delay * 1000:.0f}ms (exposed after it)"
+        print(line)
+    cam.disarm()
+    cam.close()
+    if len(p50) == 2:
+        print(f"  Pre-arming saved {p50['C'] - p50['armed']:.1f}ms per trigger (p50)")
+
+def benchmark_link(camera, count):
+    """Capture through CameraCapture with and without the in-budget retry"""
+    from sync_capture_test import CAPTURE_BUDGET, CameraCapture
+
+    for budget in (0.0, CAPTURE_BUDGET):
+        cam = CameraCapture(camera.port, camera.baud, budget=budget)
+        latencies = []
+        for _ in range(count):
+            t0 = time.monotonic()
+            if cam.capture() is not None:
+                latencies.append(time.monotonic() - t0)
+        cam.close()
+        latencies.sort()
+        label = f"retry within {budget * 1000:.0f}ms" if budget else "no retry"
+        print(f"  {label:18s} | {len(latencies)}/{count} frames | "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f}ms")
+        print(f"    {cam.link_health()}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulated ESP32-CAM on a pseudo-terminal")
+    ap.add_argument('--video', default=gtv.OUTPUT_PATH, help="conveyor video to pull frames from")
+    ap.add_argument('--baud', type=int, default=921600)
+    ap.add_argument('--capture-delay', type=float, default=0.03, help="sensor + encode time (s)")
+    ap.add_argument('--jitter', type=float, default=0.0, help="max random extra delay (s)")
+    ap.add_argument('--drop-rate', type=float, default=0.0, help="per-byte loss probability")
+    ap.add_argument('--truncate-rate', type=float, default=0.0, help="per-frame truncation probability")
+    ap.add_argument('--bench', type=int, metavar='N', help="capture N frames and report throughput")
+    ap.add_argument('--bench-prearm', type=int, metavar='N',
+                    help="compare N plain and N pre-armed captures")
+    ap.add_argument('--bench-link', type=int, metavar='N',
+                    help="capture N frames with and without retries (use with --drop-rate etc.)")
+    args = ap.parse_args()
+
+    camera = SimulatedCamera(load_frames(args.video), baud=args.baud,
+                             capture_delay=args.capture_delay, jitter=args.jitter,
+                             drop_rate=args.drop_rate, truncate_rate=args.truncate_rate)
+    with camera:
+        print(f"📷 Simulated ESP32-CAM on {camera.port} at {args.baud} baud")
+        if args.bench:
+            benchmark(camera, args.bench)
+            return
+        if args.bench_prearm:
+            benchmark_prearm(camera, args.bench_prearm)
+            return
+        if args.bench_link:
+            benchmark_link(camera, args.bench_link)
+            return
+        print(f"   export TYRE_CAM_PORT={camera.port}")
+        print("   Press Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    print(f"\nServed: {camera.stats}")
+
+if __name__ == "__main__":
+    main()
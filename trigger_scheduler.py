@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Trigger Scheduler
+Fires capture triggers at deadlines on the monotonic clock: a heap of
+deadlines, a coarse sleep until just before each one, then a short spin for
+precise firing. Records how late every trigger fired, and applies an explicit
+policy when the capture pipeline is saturated:
+
+    queue     block until the pipeline accepts it (later triggers slip)
+    skip      drop the trigger
+    coalesce  keep only the newest waiting trigger and retry it as room frees
+              (through retry() when given, so only the first attempt is logged)
+
+Run directly to compare against the old 1ms sleep loop and to see each policy
+against a saturated pipeline.
+"""
+
+import bisect
+import heapq
+import time
+
+SPIN_NS = 500_000  # final stretch before a deadline spent spinning, not sleeping
+RETRY_NS = 1_000_000  # how often a coalesced trigger is retried while waiting
+POLICIES = ('queue', 'skip', 'coalesce')
+
+class LatenessHistogram:
+    """Trigger lateness in fixed microsecond buckets, plus exact percentiles"""
+
+    EDGES_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.EDGES_US) + 1)
+        self.samples = []
+
+    def record(self, lateness_ns):
+        us = lateness_ns / 1000
+        self.counts[bisect.bisect_left(self.EDGES_US, us)] += 1
+        self.samples.append(us)
+
+    def percentile(self, p):
+        lat = sorted(self.samples)
+        return lat[min(len(lat) - 1, int(len(lat) * p))] if lat else 0.0
+
+    def summary(self):
+        if not self.samples:
+            return "no samples"
+        return (f"n={len(self.samples)} | p50 {self.percentile(0.5):8.1f}us | "
+                f"p95 {self.percentile(0.95):8.1f}us | p99 {self.percentile(0.99):8.1f}us | "
+                f"max {max(self.samples):8.1f}us")
+
+    def render(self, width=40):
+        """ASCII histogram, one line per non-empty bucket"""
+        peak = max(self.counts) or 1
+        lines = []
+        for i, n in enumerate(self.counts):
+            if not n:
+                continue
+            upper = f"<= {self.EDGES_US[i]}us" if i < len(self.EDGES_US) else f"> {self.EDGES_US[-1]}us"
+            lines.append(f"  {upper:>10s} | {'#' * max(1, n * width // peak):{width}s} {n}")
+        return "\n".join(lines)
+
+class TriggerScheduler:
+    """Fires fire(job, block) at each job's deadline; fire returns False if the pipeline is full"""
+
+    def __init__(self, fire, policy='queue', spin_ns=SPIN_NS, retry=None):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.fire = fire
+        self.retry = retry or fire  # coalesce retries of a trigger that already went to fire()
+        self.policy = policy
+        self.spin_ns = spin_ns
+        self.lateness = LatenessHistogram()
+        self.stats = {'fired': 0, 'skipped': 0, 'coalesced': 0}
+        self._heap = []
+        self._seq = 0  # tie-breaker so equal deadlines keep insertion order
+        self._pending = None  # coalesce: newest trigger waiting for room
+        self._pending_deadline = None
+
+    def add(self, offset_sec, job):
+        """Schedule job offset_sec after the start of run()"""
+        heapq.heappush(self._heap, (int(offset_sec * 1e9), self._seq, job))
+        self._seq += 1
+
+    def run(self, start_ns=None):
+        """Fire every scheduled job; start_ns is the monotonic_ns time of offset 0"""
+        start = time.monotonic_ns() if start_ns is None else start_ns
+        while self._heap:
+            offset, _, job = heapq.heappop(self._heap)
+            deadline = start + offset
+            self._wait_until(deadline)
+            late = time.monotonic_ns() - deadline
+            self.lateness.record(late)
+            job['lateness_ms'] = late / 1e6
+            self._dispatch(job, deadline)
+        if self._pending is not None:
+            self._fire_pending(True)
+
+    def _wait_until(self, deadline):
+        while True:
+            remaining = deadline - time.monotonic_ns()
+            if remaining <= self.spin_ns:
+                break
+            if self._pending is not None:
+                self._retry_pending()
+                time.sleep(min(remaining - self.spin_ns, RETRY_NS) / 1e9)
+            else:
+                time.sleep((remaining - self.spin_ns) / 1e9)
+        while time.monotonic_ns() < deadline:
+            pass
+
+    def _retry_pending(self):
+        self._fire_pending(False)
+
+    def _fire_pending(self, block):
+        job = self._pending
+        # Lateness as of when it actually goes out, not the first refused attempt
+        job['lateness_ms'] = (time.monotonic_ns() - self._pending_deadline) / 1e6
+        if self.retry(job, block):
+            self.stats['fired'] += 1
+            self._pending = None
+
+    def _dispatch(self, job, deadline):
+        if self.policy == 'queue':
+            self.fire(job, True)
+            self.stats['fired'] += 1
+        elif self.fire(job, False):
+            self.stats['fired'] += 1
+        elif self.policy == 'skip':
+            self.stats['skipped'] += 1
+        else:
+            if self._pending is not None:
+                self.stats['coalesced'] += 1  # the older waiting trigger is superseded
+            self._pending = job
+            self._pending_deadline = deadline
+
+    def report(self):
+        print(f"Trigger lateness ({self.policy}): {self.lateness.summary()}")
+        print(self.lateness.render())
+        print(f"  fired {self.stats['fired']} | skipped {self.stats['skipped']} | "
+              f"coalesced {self.stats['coalesced']}")
+
+def busy_wait_lateness(offsets):
+    """The original loop: wall clock polled with 1ms sleeps"""
+    hist = LatenessHistogram()
+    start_time = time.time()
+    for target_time in offsets:
+        while time.time() - start_time < target_time:
+            time.sleep(0.001)
+        hist.record(int(((time.time() - start_time) - target_time) * 1e9))
+    return hist
+
+def main():
+    from pipeline import CapturePipeline
+
+    count, interval = 200, 0.02
+    offsets = [0.05 + i * interval for i in range(count)]
+
+    cpu = time.process_time()
+    old = busy_wait_lateness(offsets)
+    old_cpu = time.process_time() - cpu
+    print(f"1ms sleep loop:  {old.summary()} | CPU {old_cpu:.2f}s")
+
+    sched = TriggerScheduler(lambda job, block: True)
+    for t in offsets:
+        sched.add(t, {})
+    cpu = time.process_time()
+    sched.run()
+    print(f"Scheduler:       {sched.lateness.summary()} | CPU {time.process_time() - cpu:.2f}s")
+    print(sched.lateness.render())
+
+    class SlowCamera:
+        """Captures take longer than the trigger interval, saturating the pipeline"""
+        def capture(self):
+            time.sleep(interval * 1.5)
+            return b''
+
+    print(f"\nSaturated pipeline ({interval * 1500:.0f}ms captures every {interval * 1000:.0f}ms):")
+    for policy in POLICIES:
+        pipe = CapturePipeline(SlowCamera(), lambda jpeg, expected: {}, queue_size=2).start()
+        sched = TriggerScheduler(pipe.submit, policy)
+        for t in offsets[:50]:
+            sched.add(t, {})
+        sched.run()
+        pipe.close()
+        total = sorted(pipe.stats['total'].latencies)
+        print(f"  {policy:8s} | fired {sched.stats['fired']:3d} | skipped {sched.stats['skipped']:3d} | "
+              f"coalesced {sched.stats['coalesced']:3d} | lateness p95 "
+              f"{sched.lateness.percentile(0.95) / 1000:6.1f}ms | "
+              f"end-to-end max {total[-1] * 1000:6.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Vision Trigger
+Replaces the ultrasonic gate with a trigger driven by a continuous low-res
+stream (QVGA camera feed or the conveyor video). Each frame is reduced to a
+single column profile: the mean grey level of a horizontal band through the
+tyre centreline. Columns that differ from a running belt-background profile
+are foreground; runs of them are tyres. Tyre edges are tracked across
+frames, the belt speed comes from their displacement, and the moment the
+tyre centre will cross the capture zone is predicted so the full-resolution
+capture can be fired between stream frames:
+
+    python3 vision_trigger.py                          # the test video, vs trigger_timestamps.txt
+    python3 vision_trigger.py --video test_conveyor.mp4
+    python3 vision_trigger.py --minutes 2 --exposure AUTO --stride 3
+    python3 vision_trigger.py --live 0                 # USB camera -> ESP32 capture pipeline
+
+Without --video the frames are rendered in memory by the same renderer that
+wrote test_conveyor.mp4, so the exact centre-crossing time of every tyre is
+known as well.
+"""
+
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import generate_test_video as gtv
+
+STREAM_SIZE = (320, 240)  # QVGA
+BAND = (0.42, 0.58)  # rows (fraction of height) averaged into the column profile
+DIFF_THRESHOLD = 20  # grey levels between a column and the belt background
+BG_ALPHA = 0.05  # background learning rate, belt columns only
+GAP_PX = 16  # gaps this narrow inside a tyre are filled (a bright paint dot cancels the dark rubber)
+OVERLAY_PX = 4  # foreground runs this narrow away from the border are static overlays
+MIN_WIDTH_PX = 30  # narrower runs are not tyres
+SPEED_ALPHA = 0.3  # moving-average weight of the newest belt speed sample
+MATCH_FRACTION = 0.25  # a run matches a track within this fraction of a tyre width
+MAX_MISSES = 3  # frames a track survives without a matching run
+LEAD_S = 0.0  # capture latency to fire ahead by (armed camera: the frame is taken on X)
+TIMESTAMPS_FILE = "trigger_timestamps.txt"
+
+class Track:
+    """One tyre: last edge positions and whether it has been triggered"""
+
+    def __init__(self, tid, left, right, left_ok, right_ok, t):
+        self.id = tid
+        self.left, self.right = left, right
+        self.left_ok, self.right_ok = left_ok, right_ok  # edge not cut by the frame border
+        self.t = t
+        self.misses = 0
+        self.fired = False
+
+class VisionTrigger:
+    """Feed update(frame, t) with stream frames; returns the triggers decided on that frame
+
+    A trigger is a dict with the track id, the predicted crossing time
+    't_cross', the time to fire the capture 'fire_at' (never before t) and
+    the belt speed in stream px/s.
+    """
+
+    def __init__(self, zone_x=0.5, size=STREAM_SIZE, band=BAND, threshold=DIFF_THRESHOLD,
+                 lead=LEAD_S):
+        self.size = size
+        self.zone = zone_x * size[0]  # capture zone column in the stream
+        w, h = size
+        self.rows = slice(int(band[0] * h), int(band[1] * h))
+        self.threshold = threshold
+        self.lead = lead
+        self.background = None
+        self.speed = None  # px/s, negative when the belt runs right to left
+        self.width = None  # tyre width in px, learned from fully visible tyres
+        self.tracks = []
+        self.frame_dt = None
+        self._t = None
+        self._next_id = 0
+        self._gray = np.empty((self.rows.stop - self.rows.start, w), np.uint8)
+        self._small = np.empty((h, w, 3), np.uint8)
+
+    def profile(self, frame):
+        """Mean grey level per column of the band"""
+        w, h = self.size
+        if frame.shape[1] != w or frame.shape[0] != h:
+            frame = cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(frame[self.rows], cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return cv2.reduce(self._gray, 0, cv2.REDUCE_AVG, dtype=cv2.CV_32F)[0]
+
+    def segments(self, profile):
+        """Foreground runs as (left, right) column pairs, right exclusive"""
+        if self.background is None:
+            # The belt is the brightest large region; rubber and gaps are darker
+            self.background = np.full_like(profile, np.percentile(profile, 90))
+        fg = np.abs(profile - self.background) > self.threshold
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], fg.view(np.int8), [0]))))
+        raw = list(zip(edges[::2], edges[1::2]))
+        runs = []
+        for left, right in raw:
+            if runs and left - runs[-1][1] <= GAP_PX:
+                runs[-1][1] = right
+            else:
+                runs.append([left, right])
+        runs = [(l, r) for l, r in runs if r - l >= MIN_WIDTH_PX]
+
+        # Learn the belt outside anything foreground, except thin interior
+        # runs (static overlay lines) so they fade into the background. A tyre
+        # edging in at the border is never learned, however narrow it is.
+        belt = ~fg
+        for l, r in raw:
+            if r - l <= OVERLAY_PX and l > 0 and r < len(profile):
+                belt[l:r] = True
+        for l, r in runs:
+            belt[max(0, l - OVERLAY_PX):r + OVERLAY_PX] = False
+        self.background[belt] += BG_ALPHA * (profile[belt] - self.background[belt])
+        return runs
+
+    def update(self, frame, t):
+        w = self.size[0]
+        runs = self.segments(self.profile(frame))
+        dt = t - self._t if self._t is not None else None
+        self._t = t
+        if dt:
+            self.frame_dt = dt if self.frame_dt is None else self.frame_dt + 0.1 * (dt - self.frame_dt)
+
+        unmatched = list(runs)
+        speed_samples = []
+        for track in self.tracks:
+            run = self._match(track, unmatched, t)
+            if run is None:
+                track.misses += 1
+                continue
+            unmatched.remove(run)
+            left, right = run
+            left_ok, right_ok = left > 0, right < w
+            # Only edges seen whole in both frames say how far the belt moved
+            moves = []
+            if left_ok and track.left_ok:
+                moves.append(left - track.left)
+            if right_ok and track.right_ok:
+                moves.append(right - track.right)
+            if moves and t > track.t:
+                speed_samples.append(np.mean(moves) / (t - track.t))
+            if left_ok and right_ok:
+                width = right - left
+                self.width = width if self.width is None else self.width + 0.2 * (width - self.width)
+            track.left, track.right, track.left_ok, track.right_ok = left, right, left_ok, right_ok
+            track.t, track.misses = t, 0
+        for sample in speed_samples:
+            self.speed = sample if self.speed is None else self.speed + SPEED_ALPHA * (sample - self.speed)
+        for left, right in unmatched:
+            self.tracks.append(Track(self._next_id, left, right, left > 0, right < w, t))
+            self._next_id += 1
+        self.tracks = [tr for tr in self.tracks if tr.misses <= MAX_MISSES]
+        return self._triggers(t)
+
+    def _centre(self, left, right, left_ok, right_ok):
+        if left_ok and right_ok:
+            return (left + right) / 2
+        if self.width is None:
+            return None
+        if left_ok:
+            return left + self.width / 2
+        if right_ok:
+            return right - self.width / 2
+        return None
+
+    def _match(self, track, runs, t):
+        """The run closest to where the track should be now"""
+        shift = self.speed * (t - track.t) if self.speed else 0
+        tolerance = MATCH_FRACTION * (self.width or MIN_WIDTH_PX * 4)
+        best, best_d = None, tolerance
+        for left, right in runs:
+            # Compare whichever edge was visible last time
+            if track.left_ok:
+                d = abs(left - (track.left + shift))
+            else:
+                d = abs(right - (track.right + shift))
+            if d < best_d:
+                best, best_d = (left, right), d
+        return best
+
+    def _triggers(self, t):
+        if not self.speed or self.frame_dt is None:
+            return []
+        fired = []
+        for track in self.tracks:
+            if track.fired or track.misses:
+                continue
+            centre = self._centre(track.left, track.right, track.left_ok, track.right_ok)
+            if centre is None:
+                continue
+            t_cross = t + (self.zone - centre) / self.speed
+            # Decide on the last frame before the crossing; the capture is timed between frames
+            if t_cross <= t + self.frame_dt:
+                track.fired = True
+                fired.append({'track': track.id, 't_cross': t_cross,
+                              'fire_at': max(t, t_cross - self.lead), 'speed': self.speed})
+        return fired
+
+def rendered_frames(minutes=None, exposure=None):
+    """(t, frame, crossings) from the conveyor renderer; crossings are the exact centre times"""
+    cycle = minutes is not None
+    renderer = gtv.ConveyorRenderer(cycle=cycle, exact=not cycle, exposure=exposure)
+    count = int(minutes * 60 * gtv.FPS) if cycle else gtv.FPS * gtv.DURATION_SEC
+    crossings = []
+    k = 0
+    while True:
+        t = (renderer.tyre_x(k, 0) - gtv.WIDTH // 2) / renderer.belt_speed / gtv.FPS
+        if t * gtv.FPS >= count or (not cycle and k >= len(renderer.tyres)):
+            break
+        crossings.append(t)
+        k += 1
+
+    def frames():
+        file_triggers = []
+        for frame_num in range(count):
+            yield frame_num / gtv.FPS, renderer.render(frame_num, file_triggers), file_triggers
+    return frames(), crossings
+
+def video_frames(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or gtv.FPS
+
+    def frames():
+        n = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield n / fps, frame, None
+            n += 1
+        cap.release()
+    return frames()
+
+def load_timestamps(path):
+    """First trigger time per tyre, as sync_capture_test.py uses them"""
+    times = {}
+    with open(path) as f:
+        next(f)
+        for line in f:
+            parts = line.strip().split(',')
+            times.setdefault(int(parts[2]), float(parts[1]))
+    return [times[k] for k in sorted(times)]
+
+def run(frames, stride=1, **kwargs):
+    """Stream frames through a VisionTrigger; returns (fire times, per-frame cost in ms)"""
+    trigger = VisionTrigger(**kwargs)
+    fires, cost = [], []
+    last_frame_t = 0
+    for i, (t, frame, _) in enumerate(frames):
+        last_frame_t = t
+        if i % stride:
+            continue
+        t0 = time.perf_counter()
+        events = trigger.update(frame, t)
+        spent = time.perf_counter() - t0
+        cost.append(spent * 1000)
+        # A capture can't fire before the frame that predicted it has been processed
+        fires.extend(max(e['fire_at'], t + spent) for e in events)
+    return fires, cost, last_frame_t
+
+def match(fires, truth, window):
+    """Pair each ground-truth time with the nearest fire within window; returns errors (s), misses, extras"""
+    errors, used = [], set()
+    for t in truth:
+        best = None
+        for i, f in enumerate(fires):
+            if i not in used and abs(f - t) <= window and (best is None or abs(f - t) < abs(fires[best] - t)):
+                best = i
+        if best is None:
+            continue
+        used.add(best)
+        errors.append(fires[best] - t)
+    return errors, len(truth) - len(errors), len(fires) - len(used)
+
+def describe(errors):
+    ms = sorted(abs(e) * 1000 for e in errors)
+    if not ms:
+        return "no matches"
+    mean = np.mean(errors) * 1000
+    return (f"mean {mean:+6.1f}ms | |err| p50 {ms[len(ms) // 2]:5.1f}ms | "
+            f"p95 {ms[min(len(ms) - 1, int(len(ms) * 0.95))]:5.1f}ms | max {ms[-1]:5.1f}ms")
+
+def benchmark(args):
+    cv2.setNumThreads(1)
+    if args.video:
+        frames, crossings = video_frames(args.video), None
+    else:
+        frames, crossings = rendered_frames(args.minutes, args.exposure)
+    fires, cost, duration = run(frames, args.stride)
+    frame_ms = 1000 / gtv.FPS * args.stride
+    window = 0.5 * (gtv.TYRE_WIDTH_PX + gtv.TYRE_SPACING_PX) / (gtv.BELT_SPEED_PX_PER_FRAME * gtv.FPS)
+
+    cost.sort()
+    print(f"Stream: {len(cost)} frames at {STREAM_SIZE[0]}x{STREAM_SIZE[1]}, one every "
+          f"{frame_ms:.1f}ms | {len(fires)} triggers fired")
+    print(f"  Per-frame cost: p50 {cost[len(cost) // 2]:.3f}ms | p99 "
+          f"{cost[int(len(cost) * 0.99)]:.3f}ms | max {cost[-1]:.3f}ms "
+          f"({cost[len(cost) // 2] / frame_ms * 100:.1f}% of the frame interval)")
+    if crossings is not None:
+        errors, missed, extra = match(fires, crossings, window)
+        print(f"  vs exact centre crossing:  {describe(errors)} | missed {missed} | false {extra}")
+    if args.minutes is None:
+        truth = load_timestamps(args.timestamps)
+        truth = [t for t in truth if t <= duration]
+        errors, missed, extra = match(fires, truth, window)
+        print(f"  vs {args.timestamps}: {describe(errors)} | missed {missed} | false {extra}")
+        if crossings is not None:
+            # How far the frame-quantised timestamps themselves sit from the true crossing
+            file_errors, _, _ = match(truth, crossings, window)
+            print(f"  (timestamps file vs exact: {describe(file_errors)})")
+
+def live(args):
+    """Trigger the ESP32 capture pipeline from a low-res USB camera"""
+    from pipeline import CapturePipeline
+    from sync_capture_test import BAUD_RATE, SERIAL_PORT, CameraCapture, analyze_frame
+
+    cap = cv2.VideoCapture(int(args.live) if args.live.isdigit() else args.live)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, STREAM_SIZE[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, STREAM_SIZE[1])
+    camera = CameraCapture(SERIAL_PORT, BAUD_RATE)
+    camera.arm()
+
+    def report(result):
+        print(f"  Track {result['trigger']['track']}: {result.get('verdict', 'capture failed')} "
+              f"(solidity {result.get('solidity', 'N/A')})")
+
+    pipe = CapturePipeline(camera, analyze_frame, on_result=report).start()
+    trigger = VisionTrigger()
+    print("Vision trigger running, Ctrl-C to stop")
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            now = time.monotonic()
+            for event in trigger.update(frame, now):
+                event['expected'] = None
+                # Fire between stream frames, at the predicted crossing
+                threading.Timer(max(0, event['fire_at'] - time.monotonic()),
+                                pipe.submit, (event, False)).start()
+    except KeyboardInterrupt:
+        pass
+    cap.release()
+    pipe.close()
+    pipe.report()
+    camera.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Vision-based capture trigger")
+    ap.add_argument('--video', help="stream this video instead of rendering the test conveyor")
+    ap.add_argument('--timestamps', default=TIMESTAMPS_FILE, help="ground-truth trigger file")
+    ap.add_argument('--minutes', type=float, help="render a longer cycled run (exact ground truth only)")
+    ap.add_argument('--exposure', choices=sorted(gtv.EXPOSURE_MS), help="stream with this motion blur")
+    ap.add_argument('--stride', type=int, default=1, help="use every Nth frame (slower stream)")
+    ap.add_argument('--live', metavar='DEVICE', help="camera index or URL to trigger from")
+    args = ap.parse_args()
+    if args.live:
+        live(args)
+    else:
+        benchmark(args)
+
+if __name__ == "__main__":
+    main()